@@ -1,11 +1,12 @@
 from django.contrib import admin
 from .models import Customer, Cash, Voucher, VoucherLink
+from .voucherhandler import clear_next_voucher_reset
 
 
 class CashInline(admin.StackedInline):
     """Customises the view of cash when inline"""
     model = Cash
-    exclude = ["voucher_value"]
+    exclude = ["voucher_value", "next_voucher_reset"]
 
 
 class VoucherLinkInline(admin.StackedInline):
@@ -22,5 +23,10 @@ class CustomerAdmin(admin.ModelAdmin):
     fields = ["first_name", "surname", "card_number"]
     inlines = [CashInline, VoucherLinkInline]
 
+    def save_related(self, request, form, formsets, change):
+        """Recheck the customer's vouchers after editing them here"""
+        super(CustomerAdmin, self).save_related(request, form, formsets, change)
+        clear_next_voucher_reset(customer_id=form.instance.pk)
+
 
 admin.site.register(Voucher)
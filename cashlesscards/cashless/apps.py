@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CashlessConfig(AppConfig):
     name = 'cashless'
+
+    def ready(self):
+        """Connect the signal handlers"""
+        from . import signals, db
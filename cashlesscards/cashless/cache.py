@@ -0,0 +1,70 @@
+"""
+Versioned cache-aside helpers
+
+Cached values are stored under a namespace whose version number is part of
+every key. Invalidating a namespace bumps its version, so all of its old
+entries are skipped at once and left to expire, without having to track
+which keys were written.
+"""
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+
+# seconds a cached value is kept for at most
+CACHE_TIMEOUT = 60 * 60
+
+KEY_PREFIX = 'cashless'
+
+# namespace invalidated when a voucher changes
+VOUCHERS = 'vouchers'
+
+
+def namespace_version(namespace):
+    """Returns the current version number of a namespace"""
+    version_key = KEY_PREFIX + ':version:' + namespace
+    version = cache.get(version_key)
+    if version is None:
+        # add rather than set, in case another process got there first
+        cache.add(version_key, _new_version(), None)
+        version = cache.get(version_key)
+    return version
+
+
+def make_key(namespace, key):
+    """Returns the cache key for an entry in the current version of a namespace"""
+    return KEY_PREFIX + ':' + namespace + ':' + str(namespace_version(namespace)) + ':' + str(key)
+
+
+def cache_aside(namespace, key, compute, timeout=CACHE_TIMEOUT):
+    """Returns the cached value for the key, computing and caching it on a miss"""
+    full_key = make_key(namespace, key)
+    value = cache.get(full_key)
+    if value is None:
+        value = compute()
+        cache.set(full_key, value, timeout)
+    return value
+
+
+def invalidate(namespace):
+    """Discards every entry in a namespace, now and again once the current
+    database transaction commits, so a value read from the database before
+    the commit isn't left cached"""
+    _bump_version(namespace)
+    transaction.on_commit(lambda: _bump_version(namespace))
+
+
+def _bump_version(namespace):
+    """Moves a namespace on to a new version"""
+    version_key = KEY_PREFIX + ':version:' + namespace
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        # the version was missing or culled
+        cache.set(version_key, _new_version(), None)
+
+
+def _new_version():
+    """Returns a starting version that won't match any earlier version's
+    entries, even if the old version number was lost from the cache"""
+    return int(time.time() * 1000)
@@ -0,0 +1,80 @@
+"""
+Card number lookups for the search page
+
+Each swipe maps a card number to a customer id through a small in-process
+LRU, backed by the shared cache, before loading the customer and their cash
+account in one query by primary key. The query also checks the card number,
+so an out of date entry left in another process's LRU is caught and the card
+is looked up afresh.
+"""
+import threading
+from collections import OrderedDict
+from django.core.cache import cache
+
+from .cache import CACHE_TIMEOUT, KEY_PREFIX
+from .models import Customer
+
+
+# number of card numbers remembered by each process
+CARD_CACHE_SIZE = 4096
+
+_cards = OrderedDict()
+_cards_lock = threading.Lock()
+
+
+def card_key(card_number):
+    """Returns the shared cache key for a card number"""
+    return KEY_PREFIX + ':card:' + str(card_number)
+
+
+def card_customer_id(card_number):
+    """Returns the id of the customer holding the card, or None if there isn't one"""
+    # keyed by number, so '99' and 99 share an entry and are forgotten together
+    card_number = int(card_number)
+    with _cards_lock:
+        customer_id = _cards.get(card_number)
+        if customer_id is not None:
+            _cards.move_to_end(card_number)
+            return customer_id
+
+    customer_id = cache.get(card_key(card_number))
+    if customer_id is None:
+        customer_id = Customer.objects.filter(card_number=card_number).values_list(
+            'pk', flat=True
+        ).first()
+        if customer_id is None:
+            return None
+        cache.set(card_key(card_number), customer_id, CACHE_TIMEOUT)
+
+    _remember_card(card_number, customer_id)
+    return customer_id
+
+
+def find_customer(card_number):
+    """Returns the customer holding the card, with their cash account loaded"""
+    card_number = int(card_number)
+    customer_id = card_customer_id(card_number)
+    if customer_id is not None:
+        try:
+            return Customer.objects.select_related('cash').get(pk=customer_id, card_number=card_number)
+        except Customer.DoesNotExist:
+            # the card has moved on since it was cached
+            forget_card(card_number)
+    return Customer.objects.select_related('cash').get(card_number=card_number)
+
+
+def forget_card(card_number):
+    """Drops a card number from this process's LRU and the shared cache"""
+    card_number = int(card_number)
+    with _cards_lock:
+        _cards.pop(card_number, None)
+    cache.delete(card_key(card_number))
+
+
+def _remember_card(card_number, customer_id):
+    """Adds a card number to this process's LRU, dropping the least recently used"""
+    with _cards_lock:
+        _cards[card_number] = customer_id
+        _cards.move_to_end(card_number)
+        while len(_cards) > CARD_CACHE_SIZE:
+            _cards.popitem(last=False)
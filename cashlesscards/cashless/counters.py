@@ -0,0 +1,78 @@
+"""
+Running totals for the info dashboard
+
+Rather than counting and summing whole tables on each page view, the totals
+are adjusted as customers, accounts and balances change. Each total is split
+over several shard rows, and every change updates one shard picked at random,
+so busy tills don't all queue for the same row lock. Reading a total sums its
+few shards.
+"""
+import random
+from decimal import Decimal
+from django.db import transaction, IntegrityError
+from django.db.models import F, Count, Sum
+
+from .models import Customer, Cash, SystemCounter
+
+
+# number of rows each total is spread over
+COUNTER_SHARDS = 8
+
+CUSTOMERS = "customers"
+ACCOUNTS = "accounts"
+CASH = "cash"
+VOUCHER = "voucher"
+
+
+def add_to_counters(**deltas):
+    """Adds the amounts to the named totals, to be called in the same
+    database transaction as the change they count"""
+    shard = random.randrange(COUNTER_SHARDS)
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        rows = SystemCounter.objects.filter(name=name, shard=shard)
+        if rows.update(value=F('value') + delta):
+            continue
+
+        try:
+            with transaction.atomic():
+                SystemCounter.objects.create(name=name, shard=shard, value=delta)
+        except IntegrityError:
+            # another till created the row first
+            rows.update(value=F('value') + delta)
+
+
+def read_counters():
+    """Returns a dict of every total"""
+    counters = {name: Decimal(0) for name in (CUSTOMERS, ACCOUNTS, CASH, VOUCHER)}
+    totals = SystemCounter.objects.values('name').annotate(total=Sum('value'))
+    for row in totals.order_by():
+        counters[row['name']] = row['total']
+    return counters
+
+
+def rebuild_counters():
+    """Recalculates every total from the customer and cash tables,
+    best run while no transactions are being made"""
+    with transaction.atomic():
+        customers = Customer.objects.count()
+        accounts = Cash.objects.aggregate(
+            count=Count('pk'),
+            cash=Sum('cash_value'),
+            voucher=Sum('voucher_value'),
+        )
+        counters = {
+            CUSTOMERS: customers,
+            ACCOUNTS: accounts['count'],
+            CASH: accounts['cash'].amount if accounts['cash'] is not None else 0,
+            VOUCHER: accounts['voucher'].amount if accounts['voucher'] is not None else 0,
+        }
+        SystemCounter.objects.all().delete()
+        # create every shard now, so later changes only need an update
+        SystemCounter.objects.bulk_create([
+            SystemCounter(name=name, shard=shard, value=value if shard == 0 else 0)
+            for name, value in counters.items()
+            for shard in range(COUNTER_SHARDS)
+        ])
+    return counters
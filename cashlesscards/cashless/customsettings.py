@@ -37,3 +37,7 @@ USE_STRIPE = True
 # see https://stripe.com/docs/currencies#minimum-and-maximum-charge-amounts
 # for details of absolute stripe.js minimums
 MINIMUM_CARD_PAYMENT_VALUE = 0.3
+
+
+# keep daily transaction totals for each customer as well as overall
+ROLLUP_BY_CUSTOMER = False
@@ -0,0 +1,58 @@
+"""
+Database connection setup and health checks
+
+SQLite databases can list PRAGMAS in their settings, which are applied to each
+new connection. The production SQLite profile uses them to turn on WAL
+journaling, so the pages keep reading while a till writes.
+
+With CONN_MAX_AGE set, each server worker keeps its database connection open
+between requests instead of connecting afresh every time. A kept connection
+can be dropped by the database while it sits idle (MySQL's wait_timeout, or a
+restart), so it's pinged before each request reuses it and closed if it has
+gone, leaving Django to open a new one on the request's first query.
+
+SQLite ignores select_for_update, and its transactions only take the write
+lock at their first write. A transaction that reads before writing fails at
+once with "database is locked" if another connection wrote in between, and
+busy_timeout doesn't help. So rows locked for update are first written back
+unchanged on SQLite, which makes the transaction wait its turn for the write
+lock before it reads anything.
+"""
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models import F
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    """Applies a SQLite database's configured pragmas to a new connection"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute("PRAGMA " + name + " = " + str(value))
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    """Closes any kept connection that's no longer usable"""
+    for conn in connections.all():
+        # nothing to check if no connection is open or none are kept
+        if conn.connection is None or not conn.settings_dict['CONN_MAX_AGE']:
+            continue
+        if not conn.is_usable():
+            conn.close()
+
+
+def lock_rows(queryset):
+    """Returns the queryset with its rows locked until the end of the
+    transaction, which must be the transaction's first statement on SQLite"""
+    if connections[queryset.db].vendor == 'sqlite':
+        pk = queryset.model._meta.pk.name
+        queryset.update(**{pk: F(pk)})
+    return queryset.select_for_update()
@@ -5,7 +5,7 @@ from djmoney.forms.fields import MoneyField
 from djmoney.money import Money
 
 from . import customsettings
-from .models import Voucher
+from .models import Voucher, VoucherLink, Customer
 
 
 class AddCashForm(forms.Form):
@@ -97,12 +97,15 @@ class AddCashForStripePaymentForm(forms.Form):
 class AddVoucherLinkForm(forms.Form):
     """Generates the form for adding a voucher to a customer's record"""
 
+    link_exists_message = ugettext_lazy(
+        'Invalid value - voucher already assigned to customer'
+    )
+
     def __init__(self, *args, **kwargs):
         """Initializes the form to handle special arguments"""
-        self.existing_vouchers = kwargs.pop('existing_vouchers')
+        self.customer_id = kwargs.pop('customer_id')
         super(AddVoucherLinkForm, self).__init__(*args, **kwargs)
 
-
     voucher = forms.ModelChoiceField(
         queryset=Voucher.objects.all().order_by('voucher_name'),
         to_field_name="pk",
@@ -121,10 +124,8 @@ class AddVoucherLinkForm(forms.Form):
         data = data.pk
 
         # Check if a voucher is already assigned
-        if data in self.existing_vouchers:
-            raise ValidationError(ugettext_lazy(
-                'Invalid value - voucher already assigned to customer'
-            ))
+        if VoucherLink.objects.filter(customer_id=self.customer_id, voucher_id=data).exists():
+            raise ValidationError(self.link_exists_message)
 
         # Return the cleaned data
         return data
@@ -148,11 +149,7 @@ class RemoveVoucherLinkForm(forms.Form):
 
 class CreateNewVoucherForm(forms.Form):
     """Generates the form for creating a new voucher"""
-
-    def __init__(self, *args, **kwargs):
-        """Initializes the form to handle special arguments"""
-        self.existing_vouchers = kwargs.pop('existing_vouchers')
-        super(CreateNewVoucherForm, self).__init__(*args, **kwargs)
+    voucher_exists_message = ugettext_lazy('Invalid value - voucher already exists')
 
     application = forms.ChoiceField(
         choices=customsettings.TIMING,
@@ -180,7 +177,7 @@ class CreateNewVoucherForm(forms.Form):
         # Return the cleaned data
         return v_application
 
-    def clean_voucher_name(self):
+    def clean_name(self):
         """cleans up user data before creating voucher"""
         v_name = self.cleaned_data['name']
 
@@ -189,10 +186,8 @@ class CreateNewVoucherForm(forms.Form):
             raise ValidationError(ugettext_lazy('Invalid value - no voucher name entered'))
 
         # Check if a voucher already exists
-        if v_name in self.existing_vouchers:
-            raise ValidationError(ugettext_lazy(
-                'Invalid value - voucher already exists'
-            ))
+        if Voucher.objects.filter(voucher_name=v_name).exists():
+            raise ValidationError(self.voucher_exists_message)
 
         # Return the cleaned data
         return v_name
@@ -213,13 +208,28 @@ class CreateNewVoucherForm(forms.Form):
         return v_value
 
 
+class UpdateVoucherForm(forms.ModelForm):
+    """Generates the form for editing an existing voucher"""
+    propagate = forms.BooleanField(
+        required=False,
+        help_text="Apply a change in value to customers' current voucher balances now."
+    )
+
+    class Meta:
+        """Declare the model and fields edited by the form"""
+        model = Voucher
+        fields = [
+            'voucher_application',
+            'voucher_name',
+            'voucher_value'
+        ]
+
+
 class CreateNewCustomerForm(forms.Form):
     """Generates the form for creating a new customer account"""
-
-    def __init__(self, *args, **kwargs):
-        """Initializes the form to handle special arguments"""
-        self.existing_cards = kwargs.pop('existing_cards')
-        super(CreateNewCustomerForm, self).__init__(*args, **kwargs)
+    card_exists_message = ugettext_lazy(
+        'Invalid value - a card with this number already exists on the system'
+    )
 
     first_name = forms.CharField(
         max_length=255,
@@ -278,10 +288,8 @@ class CreateNewCustomerForm(forms.Form):
             raise ValidationError(ugettext_lazy("Invalid value - card number can't be negative"))
 
         # Check if a card number already exists
-        if c_card_number in self.existing_cards:
-            raise ValidationError(ugettext_lazy(
-                'Invalid value - a card with this number already exists on the system'
-            ))
+        if Customer.objects.filter(card_number=c_card_number).exists():
+            raise ValidationError(self.card_exists_message)
 
         # Return the cleaned data
         return c_card_number
@@ -296,3 +304,30 @@ class CreateNewCustomerForm(forms.Form):
 
         # Return the cleaned data
         return c_opening_balance
+
+
+class ActivityLogFilterForm(forms.Form):
+    """Generates the form for choosing the dates shown in the transaction log"""
+    start = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date'}),
+        help_text="Show transactions from this date."
+    )
+    end = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date'}),
+        help_text="Show transactions up to and including this date."
+    )
+
+    def clean(self):
+        """cleans up user data before filtering the log"""
+        cleaned_data = super().clean()
+        start = cleaned_data.get('start')
+        end = cleaned_data.get('end')
+
+        # Check the range isn't back to front
+        if start and end and start > end:
+            raise ValidationError(ugettext_lazy('Invalid range - start date is after end date'))
+
+        # Return the cleaned data
+        return cleaned_data
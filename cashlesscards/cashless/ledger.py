@@ -0,0 +1,140 @@
+"""
+Balance queries over the append-only transaction log
+
+A customer's balance at any time is their most recent snapshot plus the
+signed value of each transaction logged since, so historic balances only
+need to read recent transactions rather than the whole log.
+"""
+import datetime
+from django.db import transaction
+from django.db.models import Case, When, F, Max, Sum, BigIntegerField
+from django.utils.timezone import now
+
+from .models import Cash, Transaction, BalanceSnapshot
+from .money import to_pence, from_pence
+
+
+# transactions logged this recently are left out of a new snapshot
+# so any still being committed don't fall between checkpoints
+SNAPSHOT_DELAY = datetime.timedelta(minutes=5)
+
+# number of rows fetched from the database at a time when streaming
+STREAM_CHUNK_SIZE = 2000
+
+
+def signed_sum(field):
+    """Sums a transaction value field in pence, counting debits as negative"""
+    return Sum(Case(
+        When(transaction_type=Transaction.debit, then=-F(field)),
+        default=F(field),
+        output_field=BigIntegerField(),
+    ))
+
+
+def balance_as_of(customer_id, when):
+    """Returns the customer's cash and voucher balances at the given time"""
+    cash = voucher = 0
+    log = Transaction.objects.filter(customer_id=customer_id, transaction_time__lte=when)
+
+    # start from the latest snapshot before the time, if any
+    snapshot = BalanceSnapshot.objects.filter(
+        customer_id=customer_id,
+        taken_at__lte=when,
+    ).order_by('-taken_at').first()
+    if snapshot is not None:
+        cash = to_pence(snapshot.cash_value)
+        voucher = to_pence(snapshot.voucher_value)
+        log = log.filter(transaction_time__gt=snapshot.taken_at)
+
+    totals = log.aggregate(
+        cash=signed_sum('transaction_value'),
+        voucher=signed_sum('voucher_value'),
+    )
+    return (
+        from_pence(cash + (totals['cash'] or 0)),
+        from_pence(voucher + (totals['voucher'] or 0)),
+    )
+
+
+def take_snapshots(taken_at=None):
+    """Records every customer's balances at a checkpoint, carried forward from
+    the previous checkpoint, and returns the number of snapshots taken"""
+    if taken_at is None:
+        taken_at = now() - SNAPSHOT_DELAY
+
+    with transaction.atomic():
+        # carry forward the balances from the previous checkpoint
+        previous = BalanceSnapshot.objects.filter(
+            taken_at__lte=taken_at
+        ).aggregate(Max('taken_at'))['taken_at__max']
+        balances = {}
+        log = Transaction.objects.filter(
+            customer__isnull=False,
+            transaction_time__lte=taken_at,
+        )
+        if previous is not None:
+            snapshots = BalanceSnapshot.objects.filter(taken_at=previous).values_list(
+                'customer_id', 'cash_value', 'voucher_value'
+            )
+            for customer_id, cash, voucher in snapshots:
+                balances[customer_id] = [to_pence(cash), to_pence(voucher)]
+            log = log.filter(transaction_time__gt=previous)
+
+        # add each customer's transactions since then, totalled in the database
+        deltas = log.order_by().values('customer_id').annotate(
+            cash=signed_sum('transaction_value'),
+            voucher=signed_sum('voucher_value'),
+        ).values_list('customer_id', 'cash', 'voucher')
+        for customer_id, cash, voucher in deltas:
+            balance = balances.setdefault(customer_id, [0, 0])
+            balance[0] += cash
+            balance[1] += voucher
+
+        BalanceSnapshot.objects.bulk_create([
+            BalanceSnapshot(
+                customer_id=customer_id,
+                taken_at=taken_at,
+                cash_value=from_pence(cash),
+                voucher_value=from_pence(voucher),
+            )
+            for customer_id, (cash, voucher) in balances.items()
+        ], batch_size=500)
+
+    return len(balances)
+
+
+def reconcile_accounts(first_id, last_id, chunk_size=STREAM_CHUNK_SIZE):
+    """Compares the balances of customers in the id range against the totals of
+    their logged transactions, returning the number of accounts checked and
+    a list of (customer id, cash, logged cash, voucher, logged voucher) mismatches"""
+    accounts = Cash.objects.filter(
+        customer_id__gte=first_id,
+        customer_id__lte=last_id,
+    ).order_by('customer_id').values_list(
+        'customer_id', 'cash_value', 'voucher_value'
+    ).iterator(chunk_size=chunk_size)
+    totals = Transaction.objects.filter(
+        customer_id__gte=first_id,
+        customer_id__lte=last_id,
+    ).order_by('customer_id').values('customer_id').annotate(
+        cash=signed_sum('transaction_value'),
+        voucher=signed_sum('voucher_value'),
+    ).values_list('customer_id', 'cash', 'voucher').iterator(chunk_size=chunk_size)
+
+    # walk both streams in customer order, so memory use doesn't grow with the range
+    checked = 0
+    mismatches = []
+    logged = next(totals, None)
+    for customer_id, cash, voucher in accounts:
+        while logged is not None and logged[0] < customer_id:
+            logged = next(totals, None)
+        logged_cash = logged_voucher = 0
+        if logged is not None and logged[0] == customer_id:
+            logged_cash, logged_voucher = logged[1] or 0, logged[2] or 0
+
+        checked += 1
+        logged_cash, logged_voucher = from_pence(logged_cash), from_pence(logged_voucher)
+        if cash != logged_cash or voucher != logged_voucher:
+            mismatches.append((customer_id, cash, logged_cash, voucher, logged_voucher))
+
+    return checked, mismatches
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from cashless.updates import refresh_version_check
+
+
+class Command(BaseCommand):
+    """Checks github for a newer version of the system"""
+    help = "Refreshes the cached update check shown on the info page"
+
+    def handle(self, *args, **options):
+        """Run the update check"""
+        result = refresh_version_check()
+        if result is None:
+            self.stdout.write("Unable to check for updates")
+        elif result[0]:
+            self.stdout.write("Version " + str(result[1]) + " is up to date")
+        else:
+            self.stdout.write("Version " + str(result[1]) + " is available")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from cashless.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    """Recalculates the info page totals from the customer and cash tables"""
+    help = "Rebuilds the running totals shown on the info page, e.g. after editing balances in the admin"
+
+    def handle(self, *args, **options):
+        """Run the rebuild"""
+        counters = rebuild_counters()
+        for name, value in counters.items():
+            self.stdout.write(name + ": " + str(value))
@@ -0,0 +1,32 @@
+import datetime
+from django.core.management.base import BaseCommand
+
+from cashless.rollups import rebuild_rollups
+
+
+def parse_date(value):
+    """Reads a YYYY-MM-DD date from the command line"""
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+class Command(BaseCommand):
+    """Rebuilds the daily transaction totals from the transaction log"""
+    help = "Recalculates the daily transaction totals used by the summary report"
+
+    def add_arguments(self, parser):
+        """Declare the command line options"""
+        parser.add_argument(
+            '--start',
+            type=parse_date,
+            help="First day to rebuild (YYYY-MM-DD), defaults to the start of the log",
+        )
+        parser.add_argument(
+            '--end',
+            type=parse_date,
+            help="Last day to rebuild (YYYY-MM-DD), defaults to the end of the log",
+        )
+
+    def handle(self, *args, **options):
+        """Run the rebuild"""
+        written = rebuild_rollups(options['start'], options['end'])
+        self.stdout.write("Wrote " + str(written) + " daily totals")
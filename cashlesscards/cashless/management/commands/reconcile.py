@@ -0,0 +1,87 @@
+import multiprocessing
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Max, Min
+
+from cashless.ledger import reconcile_accounts, STREAM_CHUNK_SIZE
+from cashless.models import Cash
+from cashless.replica import reporting
+
+
+# number of customer id ranges handed to each worker process
+RANGES_PER_WORKER = 4
+
+
+def reconcile_range(args):
+    """Reconciles one range of customers in a worker process"""
+    first_id, last_id, chunk_size = args
+    try:
+        with reporting():
+            return reconcile_accounts(first_id, last_id, chunk_size)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    """Checks customers' balances against the transaction log"""
+    help = "Reports any customer whose cash or voucher balance differs from their transactions"
+
+    def add_arguments(self, parser):
+        """Declare the command line options"""
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help="Number of processes to split the customers across",
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=STREAM_CHUNK_SIZE,
+            help="Number of rows to fetch from the database at a time",
+        )
+
+    def handle(self, *args, **options):
+        """Run the reconciliation and print the mismatch report"""
+        with reporting():
+            self.reconcile(options)
+
+    def reconcile(self, options):
+        """Check each range of customers and print the mismatches"""
+        workers = max(options['workers'], 1)
+        chunk_size = options['chunk_size']
+        bounds = Cash.objects.aggregate(first=Min('customer_id'), last=Max('customer_id'))
+        if bounds['first'] is None:
+            self.stdout.write("No accounts to reconcile")
+            return
+
+        # split the customers into contiguous id ranges
+        count = workers * RANGES_PER_WORKER if workers > 1 else 1
+        step = (bounds['last'] - bounds['first']) // count + 1
+        ranges = [
+            (first_id, first_id + step - 1, chunk_size)
+            for first_id in range(bounds['first'], bounds['last'] + 1, step)
+        ]
+
+        if workers > 1:
+            # worker processes must open their own database connections
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                results = pool.map(reconcile_range, ranges)
+        else:
+            results = [reconcile_accounts(*args) for args in ranges]
+
+        checked = 0
+        mismatched = 0
+        for range_checked, mismatches in results:
+            checked += range_checked
+            for customer_id, cash, logged_cash, voucher, logged_voucher in mismatches:
+                mismatched += 1
+                self.stdout.write(
+                    "Customer " + str(customer_id)
+                    + ": cash " + str(cash) + " logged " + str(logged_cash)
+                    + ", voucher " + str(voucher) + " logged " + str(logged_voucher)
+                )
+        self.stdout.write(
+            "Checked " + str(checked) + " accounts, " + str(mismatched) + " mismatched"
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from cashless.voucherhandler import reset_due_vouchers, RESET_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """Resets all due vouchers ahead of the day's trading"""
+    help = "Resets every due voucher and credits the customers' voucher balances"
+
+    def add_arguments(self, parser):
+        """Declare the command line options"""
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RESET_BATCH_SIZE,
+            help="Number of customers to reset in each database transaction",
+        )
+
+    def handle(self, *args, **options):
+        """Run the bulk voucher reset"""
+        credited = reset_due_vouchers(batch_size=options['batch_size'])
+        self.stdout.write("Reset vouchers on " + str(credited) + " customer accounts")
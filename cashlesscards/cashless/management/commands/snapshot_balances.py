@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from cashless.ledger import take_snapshots
+
+
+class Command(BaseCommand):
+    """Checkpoints customers' balances for historic balance queries"""
+    help = "Records a snapshot of every customer's balances from the transaction log"
+
+    def handle(self, *args, **options):
+        """Take the snapshots"""
+        taken = take_snapshots()
+        self.stdout.write("Recorded balance snapshots for " + str(taken) + " customers")
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.4 on 2026-10-18 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashless', '0018_auto_20180930_1302'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cash',
+            name='next_voucher_reset',
+            field=models.DateField(blank=True, help_text="The date the customer's next voucher is due, blank if not yet known", null=True),
+        ),
+    ]
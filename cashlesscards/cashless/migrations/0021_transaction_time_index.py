@@ -0,0 +1,17 @@
+# Generated by Django 2.2.4 on 2026-10-18 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashless', '0020_balancesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['transaction_time'], name='cashless_tr_transac_478604_idx'),
+        ),
+    ]
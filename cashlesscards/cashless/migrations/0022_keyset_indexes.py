@@ -0,0 +1,25 @@
+# Generated by Django 2.2.4 on 2026-10-18 07:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashless', '0021_transaction_time_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='cashless_tr_transac_478604_idx',
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['surname', 'first_name', 'id'], name='cashless_cu_surname_8fd08f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['transaction_time', 'id'], name='cashless_tr_transac_18f389_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 2.2.4 on 2026-10-18 07:28
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def count_existing(apps, schema_editor):
+    """Start the totals from the customers and accounts already in the system"""
+    Customer = apps.get_model('cashless', 'Customer')
+    Cash = apps.get_model('cashless', 'Cash')
+    SystemCounter = apps.get_model('cashless', 'SystemCounter')
+    accounts = Cash.objects.aggregate(
+        count=Count('pk'),
+        cash=Sum('cash_value'),
+        voucher=Sum('voucher_value'),
+    )
+    SystemCounter.objects.bulk_create([
+        SystemCounter(name='customers', value=Customer.objects.count()),
+        SystemCounter(name='accounts', value=accounts['count']),
+        SystemCounter(name='cash', value=accounts['cash'] or 0),
+        SystemCounter(name='voucher', value=accounts['voucher'] or 0),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashless', '0023_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20)),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'default_permissions': (),
+                'unique_together': {('name', 'shard')},
+            },
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
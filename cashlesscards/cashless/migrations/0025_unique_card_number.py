@@ -0,0 +1,34 @@
+# Generated by Django 2.2.4 on 2026-10-18 07:33
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_cards(apps, schema_editor):
+    """Stop with a clear message if any card number is held by more than one customer"""
+    Customer = apps.get_model('cashless', 'Customer')
+    duplicates = Customer.objects.values('card_number').annotate(
+        holders=Count('pk')
+    ).filter(holders__gt=1).values_list('card_number', flat=True)
+    if duplicates:
+        raise RuntimeError(
+            "These card numbers are held by more than one customer: "
+            + ", ".join(str(card) for card in duplicates)
+            + ". Give each customer a different card number in the admin, then migrate again."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashless', '0024_systemcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_cards, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customer',
+            name='card_number',
+            field=models.IntegerField(unique=True),
+        ),
+    ]
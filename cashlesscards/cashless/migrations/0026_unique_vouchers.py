@@ -0,0 +1,50 @@
+# Generated by Django 2.2.4 on 2026-10-18 07:35
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_vouchers(apps, schema_editor):
+    """Stop with a clear message if any voucher name is used twice or any
+    customer has the same voucher assigned more than once"""
+    Voucher = apps.get_model('cashless', 'Voucher')
+    VoucherLink = apps.get_model('cashless', 'VoucherLink')
+    names = Voucher.objects.values('voucher_name').annotate(
+        uses=Count('pk')
+    ).filter(uses__gt=1).values_list('voucher_name', flat=True)
+    if names:
+        raise RuntimeError(
+            "These voucher names are used by more than one voucher: "
+            + ", ".join(names)
+            + ". Rename the vouchers in the admin, then migrate again."
+        )
+
+    customers = VoucherLink.objects.values('customer_id', 'voucher_id').annotate(
+        links=Count('pk')
+    ).filter(links__gt=1).values_list('customer_id', flat=True)
+    if customers:
+        raise RuntimeError(
+            "These customers have the same voucher assigned more than once: "
+            + ", ".join(str(customer) for customer in sorted(set(customers)))
+            + ". Remove the extra voucher assignments in the admin, then migrate again."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashless', '0025_unique_card_number'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_vouchers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='voucher',
+            name='voucher_name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='voucherlink',
+            unique_together={('customer', 'voucher')},
+        ),
+    ]
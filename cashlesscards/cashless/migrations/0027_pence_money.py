@@ -0,0 +1,260 @@
+# Generated by Django 2.2.4 on 2026-10-18 08:10
+
+from decimal import Decimal
+import cashless.money
+from django.db import migrations, models
+from django.db.models import F, Value, ExpressionWrapper
+from django.db.models.functions import Cast, Round
+
+from cashless import customsettings
+
+
+# the money columns of each model, stored until now as decimal amounts plus a currency
+MONEY_FIELDS = {
+    'Voucher': ['voucher_value'],
+    'Cash': ['cash_value', 'voucher_value'],
+    'VoucherLink': ['voucher_value'],
+    'Transaction': ['transaction_value', 'voucher_value'],
+    'BalanceSnapshot': ['cash_value', 'voucher_value'],
+    'DailyRollup': ['transaction_value', 'voucher_value'],
+}
+
+
+def check_currencies(apps, schema_editor):
+    """Stop with a clear message if any amount is in a currency other than
+    the system's, as the pence columns don't record a currency"""
+    problems = []
+    for model_name, fields in MONEY_FIELDS.items():
+        model = apps.get_model('cashless', model_name)
+        for field in fields:
+            rows = models.QuerySet(model).exclude(
+                **{field + '_currency': customsettings.CURRENCY}
+            ).order_by('pk').values_list('pk', flat=True)
+            if rows:
+                problems.append(
+                    model_name + " " + field + " (ids " + ", ".join(str(pk) for pk in rows) + ")"
+                )
+    if problems:
+        raise RuntimeError(
+            "These amounts aren't in " + customsettings.CURRENCY + ": "
+            + "; ".join(problems)
+            + ". Convert them to " + customsettings.CURRENCY
+            + " in the admin, or set CURRENCY in customsettings.py, then migrate again."
+        )
+
+
+def copy_to_pence(apps, schema_editor):
+    """Copy each decimal amount into its new column as a whole number of pence"""
+    for model_name, fields in MONEY_FIELDS.items():
+        model = apps.get_model('cashless', model_name)
+        # a plain queryset, as django-money's manager can't expand these expressions
+        models.QuerySet(model).update(**{
+            field + '_pence': Cast(Round(F(field) * 100), models.BigIntegerField())
+            for field in fields
+        })
+
+
+def copy_from_pence(apps, schema_editor):
+    """Copy each number of pence back into its decimal amount and currency"""
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    one_penny = Cast(Value(Decimal('0.01')), models.DecimalField(max_digits=3, decimal_places=2))
+    for model_name, fields in MONEY_FIELDS.items():
+        model = apps.get_model('cashless', model_name)
+        values = {}
+        for field in fields:
+            # multiplied as decimals, so the amounts don't pass through floating point
+            values[field] = ExpressionWrapper(F(field + '_pence') * one_penny, output_field=amount)
+            values[field + '_currency'] = customsettings.CURRENCY
+        models.QuerySet(model).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashless', '0026_unique_vouchers'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_currencies, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='voucher',
+            name='voucher_value_pence',
+            field=cashless.money.PenceMoneyField(default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='cash',
+            name='cash_value_pence',
+            field=cashless.money.PenceMoneyField(default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='cash',
+            name='voucher_value_pence',
+            field=cashless.money.PenceMoneyField(default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='voucherlink',
+            name='voucher_value_pence',
+            field=cashless.money.PenceMoneyField(default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='transaction_value_pence',
+            field=cashless.money.PenceMoneyField(default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='voucher_value_pence',
+            field=cashless.money.PenceMoneyField(default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='cash_value_pence',
+            field=cashless.money.PenceMoneyField(default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='voucher_value_pence',
+            field=cashless.money.PenceMoneyField(default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='transaction_value_pence',
+            field=cashless.money.PenceMoneyField(default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='voucher_value_pence',
+            field=cashless.money.PenceMoneyField(default=0, max_digits=14),
+        ),
+        migrations.RunPython(copy_to_pence, copy_from_pence),
+        migrations.RemoveField(
+            model_name='voucher',
+            name='voucher_value',
+        ),
+        migrations.RemoveField(
+            model_name='voucher',
+            name='voucher_value_currency',
+        ),
+        migrations.RenameField(
+            model_name='voucher',
+            old_name='voucher_value_pence',
+            new_name='voucher_value',
+        ),
+        migrations.RemoveField(
+            model_name='cash',
+            name='cash_value',
+        ),
+        migrations.RemoveField(
+            model_name='cash',
+            name='cash_value_currency',
+        ),
+        migrations.RenameField(
+            model_name='cash',
+            old_name='cash_value_pence',
+            new_name='cash_value',
+        ),
+        migrations.RemoveField(
+            model_name='cash',
+            name='voucher_value',
+        ),
+        migrations.RemoveField(
+            model_name='cash',
+            name='voucher_value_currency',
+        ),
+        migrations.RenameField(
+            model_name='cash',
+            old_name='voucher_value_pence',
+            new_name='voucher_value',
+        ),
+        migrations.RemoveField(
+            model_name='voucherlink',
+            name='voucher_value',
+        ),
+        migrations.RemoveField(
+            model_name='voucherlink',
+            name='voucher_value_currency',
+        ),
+        migrations.RenameField(
+            model_name='voucherlink',
+            old_name='voucher_value_pence',
+            new_name='voucher_value',
+        ),
+        migrations.RemoveField(
+            model_name='transaction',
+            name='transaction_value',
+        ),
+        migrations.RemoveField(
+            model_name='transaction',
+            name='transaction_value_currency',
+        ),
+        migrations.RenameField(
+            model_name='transaction',
+            old_name='transaction_value_pence',
+            new_name='transaction_value',
+        ),
+        migrations.RemoveField(
+            model_name='transaction',
+            name='voucher_value',
+        ),
+        migrations.RemoveField(
+            model_name='transaction',
+            name='voucher_value_currency',
+        ),
+        migrations.RenameField(
+            model_name='transaction',
+            old_name='voucher_value_pence',
+            new_name='voucher_value',
+        ),
+        migrations.RemoveField(
+            model_name='balancesnapshot',
+            name='cash_value',
+        ),
+        migrations.RemoveField(
+            model_name='balancesnapshot',
+            name='cash_value_currency',
+        ),
+        migrations.RenameField(
+            model_name='balancesnapshot',
+            old_name='cash_value_pence',
+            new_name='cash_value',
+        ),
+        migrations.RemoveField(
+            model_name='balancesnapshot',
+            name='voucher_value',
+        ),
+        migrations.RemoveField(
+            model_name='balancesnapshot',
+            name='voucher_value_currency',
+        ),
+        migrations.RenameField(
+            model_name='balancesnapshot',
+            old_name='voucher_value_pence',
+            new_name='voucher_value',
+        ),
+        migrations.RemoveField(
+            model_name='dailyrollup',
+            name='transaction_value',
+        ),
+        migrations.RemoveField(
+            model_name='dailyrollup',
+            name='transaction_value_currency',
+        ),
+        migrations.RenameField(
+            model_name='dailyrollup',
+            old_name='transaction_value_pence',
+            new_name='transaction_value',
+        ),
+        migrations.RemoveField(
+            model_name='dailyrollup',
+            name='voucher_value',
+        ),
+        migrations.RemoveField(
+            model_name='dailyrollup',
+            name='voucher_value_currency',
+        ),
+        migrations.RenameField(
+            model_name='dailyrollup',
+            old_name='voucher_value_pence',
+            new_name='voucher_value',
+        ),
+    ]
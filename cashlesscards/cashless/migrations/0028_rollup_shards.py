@@ -0,0 +1,103 @@
+# Generated by Django 2.2.4 on 2026-10-18 07:59
+
+import cashless.money
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def clear_rollups(apps, schema_editor):
+    """Drop the old totals, including any duplicate site-wide rows, before
+    the table is rekeyed"""
+    DailyRollup = apps.get_model('cashless', 'DailyRollup')
+    DailyRollup.objects.all().delete()
+
+
+def rebuild_rollups(apps, schema_editor):
+    """Work out every day's site-wide totals from the transaction log, so
+    systems upgraded from before there were totals have them for past days
+    too. Per customer totals, which are optional, are left to the
+    rebuild_rollups command."""
+    Transaction = apps.get_model('cashless', 'Transaction')
+    DailyRollup = apps.get_model('cashless', 'DailyRollup')
+    pence = models.BigIntegerField()
+    # a plain queryset, as django-money's manager can't group these expressions
+    totals = models.QuerySet(Transaction).annotate(
+        day=TruncDate('transaction_time'),
+    ).values('day', 'transaction_type').annotate(
+        cash=Sum('transaction_value', output_field=pence),
+        voucher=Sum('voucher_value', output_field=pence),
+        count=Count('pk'),
+    ).order_by()
+    DailyRollup.objects.bulk_create(
+        [
+            DailyRollup(
+                day=row['day'],
+                transaction_type=row['transaction_type'],
+                shard=0,
+                transaction_value=row['cash'],
+                voucher_value=row['voucher'],
+                transaction_count=row['count'],
+            )
+            for row in totals
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashless', '0027_pence_money'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_rollups, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='CustomerDailyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('transaction_type', models.CharField(choices=[('credit', 'Credit'), ('debit', 'Debit'), ('stripe', 'Stripe Credit')], max_length=6)),
+                ('transaction_value', cashless.money.PenceMoneyField(default=0, max_digits=14)),
+                ('voucher_value', cashless.money.PenceMoneyField(default=0, max_digits=14)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-day', 'transaction_type'],
+                'default_permissions': (),
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='dailyrollup',
+            name='cashless_da_custome_c8fe8b_idx',
+        ),
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyrollup',
+            unique_together={('day', 'transaction_type', 'shard')},
+        ),
+        migrations.AddField(
+            model_name='customerdailyrollup',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='cashless.Customer'),
+        ),
+        migrations.RemoveField(
+            model_name='dailyrollup',
+            name='customer',
+        ),
+        migrations.AddIndex(
+            model_name='customerdailyrollup',
+            index=models.Index(fields=['customer', 'day'], name='cashless_cu_custome_5c0628_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='customerdailyrollup',
+            unique_together={('day', 'transaction_type', 'customer')},
+        ),
+        migrations.RunPython(rebuild_rollups, migrations.RunPython.noop),
+    ]
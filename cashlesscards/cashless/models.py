@@ -3,9 +3,9 @@ import datetime
 from django.db import models
 from django.utils.timezone import now
 from django.urls import reverse
-from djmoney.models.fields import MoneyField
 
 from . import customsettings
+from .money import PenceMoneyField
 
 
 class Voucher(models.Model):
@@ -17,13 +17,8 @@ class Voucher(models.Model):
         default="daily",
         help_text="Select how often the voucher is applied to the customer's account"
     )
-    voucher_name = models.CharField(max_length=255)
-    voucher_value = MoneyField(
-        max_digits=14,
-        decimal_places=2,
-        default_currency=customsettings.CURRENCY,
-        default=0
-    )
+    voucher_name = models.CharField(max_length=255, unique=True)
+    voucher_value = PenceMoneyField(max_digits=14, default=0)
 
     class Meta:
         """Declare model-level metadata"""
@@ -40,7 +35,7 @@ class Voucher(models.Model):
 
 class Customer(models.Model):
     """The customer details table"""
-    card_number = models.IntegerField()
+    card_number = models.IntegerField(unique=True)
     first_name = models.CharField(max_length=255)
     surname = models.CharField(max_length=255)
 
@@ -52,6 +47,9 @@ class Customer(models.Model):
         permissions = (
             ("can_add_customers", "Create and edit customer accounts"),
         )
+        indexes = [
+            models.Index(fields=["surname", "first_name", "id"]),
+        ]
 
     def __str__(self):
         """String for representing the Model object"""
@@ -69,17 +67,12 @@ class Customer(models.Model):
 class Cash(models.Model):
     """The cash store table"""
     customer = models.OneToOneField(Customer, related_name='cash', on_delete=models.CASCADE)
-    cash_value = MoneyField(
-        max_digits=14,
-        decimal_places=2,
-        default_currency=customsettings.CURRENCY,
-        default=0
-    )
-    voucher_value = MoneyField(
-        max_digits=14,
-        decimal_places=2,
-        default_currency=customsettings.CURRENCY,
-        default=0,
+    cash_value = PenceMoneyField(max_digits=14, default=0)
+    voucher_value = PenceMoneyField(max_digits=14, default=0)
+    next_voucher_reset = models.DateField(
+        null=True,
+        blank=True,
+        help_text="The date the customer's next voucher is due, blank if not yet known"
     )
 
     class Meta:
@@ -103,15 +96,11 @@ class VoucherLink(models.Model):
     last_year = datetime.datetime.now() - datetime.timedelta(days=365)
 
     last_applied = models.DateField(default=last_year)
-    voucher_value = MoneyField(
-        max_digits=14,
-        decimal_places=2,
-        default_currency=customsettings.CURRENCY,
-        default=0,
-    )
+    voucher_value = PenceMoneyField(max_digits=14, default=0)
 
     class Meta:
         """Declare model-level metadata"""
+        unique_together = ('customer', 'voucher')
         default_permissions = ()
         permissions = (
             ("can_assign_voucher", "Assign vouchers to customers"),
@@ -137,18 +126,8 @@ class Transaction(models.Model):
         choices=transact_choices,
         default=credit
     )
-    transaction_value = MoneyField(
-        max_digits=14,
-        decimal_places=2,
-        default_currency=customsettings.CURRENCY,
-        default=0
-    )
-    voucher_value = MoneyField(
-        max_digits=14,
-        decimal_places=2,
-        default_currency=customsettings.CURRENCY,
-        default=0
-    )
+    transaction_value = PenceMoneyField(max_digits=14, default=0)
+    voucher_value = PenceMoneyField(max_digits=14, default=0)
 
     class Meta:
         """Declare model-level metadata to control default ordering of records and set plural"""
@@ -158,3 +137,77 @@ class Transaction(models.Model):
         permissions = (
             ("view_finance", "Can view transaction log"),
         )
+        indexes = [
+            models.Index(fields=["customer", "transaction_time"]),
+            models.Index(fields=["transaction_time", "id"]),
+        ]
+
+
+class BalanceSnapshot(models.Model):
+    """Each customer's balances at a checkpoint in the transaction log"""
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    taken_at = models.DateTimeField(default=now)
+    cash_value = PenceMoneyField(max_digits=14, default=0)
+    voucher_value = PenceMoneyField(max_digits=14, default=0)
+
+    class Meta:
+        """Declare model-level metadata to control default ordering of records"""
+        ordering = ["-taken_at"]
+        default_permissions = ()
+        indexes = [
+            models.Index(fields=["customer", "taken_at"]),
+            models.Index(fields=["taken_at"]),
+        ]
+
+
+class DailyRollup(models.Model):
+    """One shard of the totals of each day's transactions by type"""
+    day = models.DateField()
+    transaction_type = models.CharField(
+        max_length=6,
+        choices=Transaction.transact_choices,
+    )
+    shard = models.PositiveSmallIntegerField(default=0)
+    transaction_value = PenceMoneyField(max_digits=14, default=0)
+    voucher_value = PenceMoneyField(max_digits=14, default=0)
+    transaction_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """Declare model-level metadata to control default ordering of records"""
+        ordering = ["-day", "transaction_type"]
+        default_permissions = ()
+        unique_together = ("day", "transaction_type", "shard")
+
+
+class CustomerDailyRollup(models.Model):
+    """Totals of each day's transactions by type for one customer"""
+    day = models.DateField()
+    transaction_type = models.CharField(
+        max_length=6,
+        choices=Transaction.transact_choices,
+    )
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    transaction_value = PenceMoneyField(max_digits=14, default=0)
+    voucher_value = PenceMoneyField(max_digits=14, default=0)
+    transaction_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """Declare model-level metadata to control default ordering of records"""
+        ordering = ["-day", "transaction_type"]
+        default_permissions = ()
+        unique_together = ("day", "transaction_type", "customer")
+        indexes = [
+            models.Index(fields=["customer", "day"]),
+        ]
+
+
+class SystemCounter(models.Model):
+    """One shard of a running total shown on the info page"""
+    name = models.CharField(max_length=20)
+    shard = models.PositiveSmallIntegerField(default=0)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        """Declare model-level metadata"""
+        default_permissions = ()
+        unique_together = ("name", "shard")
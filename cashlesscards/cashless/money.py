@@ -0,0 +1,106 @@
+"""
+Money stored as whole pence
+
+Amounts are kept in the database as 64 bit integers counting the smallest
+unit of the single currency set in customsettings, so sums and balance
+updates in the database are plain integer arithmetic with no currency
+column alongside. On the models the values are still djmoney Money objects,
+so forms, views and templates work with them as before.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import models
+from djmoney.forms.fields import MoneyField as MoneyFormField
+from djmoney.money import Money
+
+from . import customsettings
+
+
+# digits after the decimal point in an amount of the currency
+DECIMAL_PLACES = 2
+
+# number of whole pence in one unit of the currency
+PENCE = 10 ** DECIMAL_PLACES
+
+
+def to_pence(value):
+    """Returns a Money value, or an amount of the currency, in whole pence"""
+    if isinstance(value, Money):
+        if str(value.currency) != customsettings.CURRENCY:
+            raise ValueError(
+                "Only " + customsettings.CURRENCY + " can be stored, not " + str(value.currency)
+            )
+        value = value.amount
+    return int((Decimal(value) * PENCE).to_integral_value(ROUND_HALF_UP))
+
+
+def from_pence(pence):
+    """Returns a whole number of pence as Money"""
+    return Money(Decimal(pence).scaleb(-DECIMAL_PLACES), customsettings.CURRENCY)
+
+
+class PenceMoneyField(models.BigIntegerField):
+    """A Money value stored as a whole number of pence"""
+    description = "Money stored as a whole number of pence"
+
+    def __init__(self, *args, max_digits=None, **kwargs):
+        """Keep the most digits an amount entered in a form may have"""
+        self.max_digits = max_digits
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        """Include the digit limit in migrations"""
+        name, path, args, kwargs = super().deconstruct()
+        if self.max_digits is not None:
+            kwargs['max_digits'] = self.max_digits
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        """Read the column as Money"""
+        if value is None:
+            return value
+        return from_pence(value)
+
+    def to_python(self, value):
+        """Convert a number of pence to Money"""
+        if value is None or isinstance(value, Money):
+            return value
+        return from_pence(super().to_python(value))
+
+    def get_prep_value(self, value):
+        """Convert Money to pence for the database"""
+        if isinstance(value, Money):
+            return to_pence(value)
+        return super().get_prep_value(value)
+
+    def get_default(self):
+        """Give new objects Money rather than a bare number"""
+        value = super().get_default()
+        if value is None or isinstance(value, Money):
+            return value
+        return from_pence(value)
+
+    def run_validators(self, value):
+        """Check the number of pence fits the column"""
+        if isinstance(value, Money):
+            value = to_pence(value)
+        super().run_validators(value)
+
+    def value_to_string(self, obj):
+        """Serialize the number of pence"""
+        value = self.value_from_object(obj)
+        if value is None:
+            return ''
+        return str(to_pence(value))
+
+    def formfield(self, **kwargs):
+        """Edit the value as Money"""
+        defaults = {
+            'form_class': MoneyFormField,
+            'max_digits': self.max_digits,
+            'decimal_places': DECIMAL_PLACES,
+            'default_currency': customsettings.CURRENCY,
+            'currency_choices': [(customsettings.CURRENCY, customsettings.CURRENCY)],
+        }
+        defaults.update(kwargs)
+        # skip the integer field's limits, which are in pence
+        return models.Field.formfield(self, **defaults)
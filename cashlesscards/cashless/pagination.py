@@ -0,0 +1,132 @@
+"""
+Keyset (cursor) pagination for list views
+
+Rather than counting the rows and skipping an offset, each page is read by
+seeking past the ordering key of the last row shown, so a page deep into a
+large table costs the same as the first one. Page links carry the key as an
+opaque cursor.
+"""
+import base64
+import binascii
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+class KeysetPage:
+    """One page of rows, with cursors to the pages either side"""
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        """Store the rows and cursors"""
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        """Returns whether there is a later page"""
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        """Returns whether there is an earlier page"""
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        """Returns whether there is any page either side"""
+        return self.has_next() or self.has_previous()
+
+
+def encode_cursor(direction, values):
+    """Returns an opaque cursor for reading the page after (or before) the key values"""
+    data = json.dumps([direction, [str(value) for value in values]])
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns the direction and key values held in a cursor"""
+    try:
+        direction, values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (binascii.Error, UnicodeError, ValueError, TypeError):
+        raise Http404("Invalid page")
+    if direction not in ("next", "previous"):
+        raise Http404("Invalid page")
+    return direction, values
+
+
+def seek(keyset, values, reverse=False):
+    """Returns a filter for rows after the key values in the keyset's order,
+    or before them if reverse is set"""
+    descending = keyset[0].startswith('-')
+    lookup = '__lt' if descending != reverse else '__gt'
+    names = [key.lstrip('-') for key in keyset]
+
+    # (a, b, c) > (x, y, z) is a > x, or a = x and b > y, or a = x, b = y and c > z
+    condition = Q()
+    for i, name in enumerate(names):
+        step = Q(**{name + lookup: values[i]})
+        for j in range(i):
+            step &= Q(**{names[j]: values[j]})
+        condition |= step
+    return condition
+
+
+class KeysetPaginationMixin:
+    """Replaces a list view's offset pagination with keyset pagination.
+    The keyset lists the ordering fields, which must end with a unique
+    field and all sort in the same direction."""
+    keyset = ('-pk',)
+    cursor_kwarg = 'cursor'
+
+    def get_key(self, obj):
+        """Returns the keyset values of a row"""
+        return [getattr(obj, key.lstrip('-')) for key in self.keyset]
+
+    def get_cursor_values(self, queryset, values):
+        """Converts a cursor's values back to the types of the keyset fields"""
+        if len(values) != len(self.keyset):
+            raise Http404("Invalid page")
+        opts = queryset.model._meta
+        fields = [
+            opts.pk if key.lstrip('-') == 'pk' else opts.get_field(key.lstrip('-'))
+            for key in self.keyset
+        ]
+        try:
+            return [field.to_python(value) for field, value in zip(fields, values)]
+        except ValidationError:
+            raise Http404("Invalid page")
+
+    def read_forwards(self, queryset, page_size):
+        """Returns the page of rows at the start of the queryset, with a
+        cursor to the next page if there are more rows"""
+        rows = list(queryset[:page_size + 1])
+        page = KeysetPage(rows[:page_size])
+        if len(rows) > page_size:
+            page.next_cursor = encode_cursor("next", self.get_key(rows[page_size - 1]))
+        return page
+
+    def paginate_queryset(self, queryset, page_size):
+        """Returns the page of rows chosen by the request's cursor"""
+        queryset = queryset.order_by(*self.keyset)
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        if not cursor:
+            page = self.read_forwards(queryset, page_size)
+            return (None, page, page.object_list, page.has_other_pages())
+
+        direction, values = decode_cursor(cursor)
+        values = self.get_cursor_values(queryset, values)
+        if direction == "next":
+            page = self.read_forwards(queryset.filter(seek(self.keyset, values)), page_size)
+            if page.object_list:
+                page.previous_cursor = encode_cursor("previous", self.get_key(page.object_list[0]))
+        else:
+            # read backwards from the cursor, then put the rows back in order
+            backwards = queryset.reverse().filter(seek(self.keyset, values, reverse=True))
+            rows = list(backwards[:page_size + 1])
+            if len(rows) > page_size:
+                page = KeysetPage(rows[:page_size][::-1])
+                page.previous_cursor = encode_cursor("previous", self.get_key(page.object_list[0]))
+                page.next_cursor = encode_cursor("next", self.get_key(page.object_list[-1]))
+            else:
+                # back at the start, so show a full first page
+                page = self.read_forwards(queryset, page_size)
+
+        return (None, page, page.object_list, page.has_other_pages())
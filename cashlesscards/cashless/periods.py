@@ -0,0 +1,57 @@
+"""
+Calendar period keys for the voucher application timings
+
+Each date maps to an integer identifying the daily, weekly, monthly or
+yearly period it falls within. Keys increase by one from each period to
+the next, so comparing two dates' keys tells whether a voucher is due.
+"""
+import datetime
+from functools import lru_cache
+
+
+# number of distinct (timing, date) pairs remembered by the cached functions
+PERIOD_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PERIOD_CACHE_SIZE)
+def period_key(application, day):
+    """Returns the integer id of the application period containing the day"""
+    if application == "daily":
+        return day.toordinal()
+    if application == "weekly":
+        # ordinal 1 is a Monday, so weeks run Monday to Sunday across years
+        return (day.toordinal() - 1) // 7
+    if application == "monthly":
+        return day.year * 12 + day.month - 1
+    if application == "yearly":
+        return day.year
+    raise ValueError("Unknown voucher application: " + str(application))
+
+
+@lru_cache(maxsize=PERIOD_CACHE_SIZE)
+def period_start(application, key):
+    """Returns the first day of the application period with the given id"""
+    if application == "daily":
+        return datetime.date.fromordinal(key)
+    if application == "weekly":
+        return datetime.date.fromordinal(key * 7 + 1)
+    if application == "monthly":
+        return datetime.date(key // 12, key % 12 + 1, 1)
+    if application == "yearly":
+        return datetime.date(key, 1, 1)
+    raise ValueError("Unknown voucher application: " + str(application))
+
+
+def current_period_start(application, day):
+    """Returns the first day of the application period containing the day"""
+    return period_start(application, period_key(application, day))
+
+
+def next_period_start(application, day):
+    """Returns the first day of the application period after the day"""
+    return period_start(application, period_key(application, day) + 1)
+
+
+def is_due(application, last_applied, today):
+    """Checks whether a voucher last applied on one day is due again on another"""
+    return period_key(application, last_applied) < period_key(application, today)
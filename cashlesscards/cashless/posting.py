@@ -0,0 +1,89 @@
+"""
+Posting service for crediting and debiting customers' cash accounts
+
+Every change to a balance and its transaction log entry commit together
+in one short database transaction, so concurrent tills can't overwrite
+each other's updates.
+"""
+from django.db import transaction
+from django.db.models import F
+from djmoney.money import Money
+
+from . import customsettings
+from .models import Cash, Transaction
+from .voucherhandler import split_debit, distribute_voucher_debit
+from .rollups import record_transactions
+from .counters import add_to_counters
+from .money import to_pence
+from .db import lock_rows
+
+
+class InsufficientFunds(Exception):
+    """Raised when a debit is more than the customer has available"""
+
+
+def post_credit(customer_id, value, transaction_type="credit"):
+    """Adds the value to a customer's cash balance and logs the transaction"""
+    with transaction.atomic():
+        # add to the balance in the database rather than from a stale copy
+        updated = Cash.objects.filter(customer_id=customer_id).update(
+            cash_value=F('cash_value') + to_pence(value)
+        )
+        if not updated:
+            raise Cash.DoesNotExist("No cash account for customer " + str(customer_id))
+
+        credit = Transaction.objects.create(
+            customer_id=customer_id,
+            transaction_type=transaction_type,
+            transaction_value=value,
+        )
+        record_transactions([credit])
+        add_to_counters(cash=value.amount)
+    return credit
+
+
+def post_debit(customer_id, value, cash_inst=None):
+    """Deducts the value from a customer's account, using any vouchers first,
+    logs the transaction and returns the updated cash account
+
+    Passing the cash account as already read lets the debit be made with
+    a single conditional update, only locking the row if it has changed."""
+    with transaction.atomic():
+        if cash_inst is None or not _debit_if_unchanged(cash_inst, value):
+            # the account changed since it was read, so lock it and check again
+            cash_inst = lock_rows(Cash.objects.filter(customer_id=customer_id)).get()
+            if value > cash_inst.cash_value + cash_inst.voucher_value:
+                raise InsufficientFunds
+            _debit_if_unchanged(cash_inst, value)
+
+        # spread the voucher part across the customer's vouchers and log it
+        voucher_debit, cash_debit = split_debit(cash_inst.voucher_value, value)
+        if voucher_debit > Money(0, customsettings.CURRENCY):
+            distribute_voucher_debit(cash_inst, voucher_debit)
+        debit = Transaction.objects.create(
+            customer_id=customer_id,
+            transaction_type="debit",
+            transaction_value=cash_debit,
+            voucher_value=voucher_debit,
+        )
+        record_transactions([debit])
+        add_to_counters(cash=-cash_debit.amount, voucher=-voucher_debit.amount)
+
+    cash_inst.voucher_value -= voucher_debit
+    cash_inst.cash_value -= cash_debit
+    return cash_inst
+
+
+def _debit_if_unchanged(cash_inst, value):
+    """Debits the account in one statement provided its voucher balance is
+    as read and its cash balance covers the rest, returning whether it did"""
+    voucher_debit, cash_debit = split_debit(cash_inst.voucher_value, value)
+    updated = Cash.objects.filter(
+        pk=cash_inst.pk,
+        voucher_value=cash_inst.voucher_value,
+        cash_value__gte=cash_debit,
+    ).update(
+        cash_value=F('cash_value') - to_pence(cash_debit),
+        voucher_value=F('voucher_value') - to_pence(voucher_debit),
+    )
+    return updated == 1
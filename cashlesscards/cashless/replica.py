@@ -0,0 +1,125 @@
+"""
+Sends reporting reads to a read replica of the database
+
+Reports, exports and the list pages read a lot of rows but write none, so
+when a 'replica' database is configured they read from it instead of the
+primary that serves the tills. Everything else, including every write and
+any read inside a transaction, stays on the primary.
+
+The replica lags slightly behind the primary, so after a user posts a change
+their reads are pinned to the primary for a few seconds, letting them see
+their own writes.
+"""
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+
+
+REPLICA = 'replica'
+
+# seconds a user's reads stay on the primary after they post a change
+STICKY_SECONDS = 15
+
+STICKY_COOKIE = 'cashless_primary'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_reporting = ContextVar('reporting', default=False)
+_pinned = ContextVar('pinned', default=False)
+
+
+@contextmanager
+def reporting():
+    """Sends the reads made inside the block to the replica"""
+    token = _reporting.set(True)
+    try:
+        yield
+    finally:
+        _reporting.reset(token)
+
+
+@contextmanager
+def pinned_to_primary():
+    """Keeps the reads made inside the block on the primary,
+    even in a reporting block"""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def reads_from_replica(view):
+    """Decorates a view function to read from the replica"""
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        with reporting():
+            return view(*args, **kwargs)
+    return wrapped
+
+
+class ReplicaReadMixin:
+    """Makes a class based view read from the replica"""
+    def dispatch(self, request, *args, **kwargs):
+        """Handle the request inside a reporting block"""
+        with reporting():
+            return super().dispatch(request, *args, **kwargs)
+
+
+def replica_in_use():
+    """Returns whether reads made now would go to the replica"""
+    return (
+        _reporting.get()
+        and not _pinned.get()
+        and REPLICA in settings.DATABASES
+        # reads in a transaction must see its uncommitted writes
+        and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+    )
+
+
+class ReplicaRouter:
+    """Routes reporting reads to the replica and everything else to the primary"""
+    def db_for_read(self, model, **hints):
+        """Use the replica inside a reporting block"""
+        if replica_in_use():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        """Always write to the primary, even objects read from the replica"""
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Both databases hold the same data"""
+        databases = (DEFAULT_DB_ALIAS, REPLICA)
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """The replica copies its tables from the primary"""
+        if db == REPLICA:
+            return False
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """Pins a user's reads to the primary for a few seconds after they post"""
+    def __init__(self, get_response):
+        """Keep the next handler in the chain"""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Pin the request if it, or one shortly before it, changed something"""
+        changing = request.method not in SAFE_METHODS
+        if changing or STICKY_COOKIE in request.COOKIES:
+            with pinned_to_primary():
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+
+        if changing:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=STICKY_SECONDS, httponly=True)
+        return response
@@ -0,0 +1,173 @@
+"""
+Daily totals of the transaction log
+
+Each posted transaction adds to its day's running totals as it's logged,
+so reports over months or years read one row per day and type instead of
+scanning the log. The totals can be rebuilt from the log at any time.
+
+Every till adds to the same few site-wide totals, so like the dashboard
+counters each is split over several shard rows, with each posting adding
+to one picked at random and reports summing the shards. Per customer totals
+are kept in their own table, each row only ever written by one customer's
+transactions.
+"""
+import datetime
+from random import randrange
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from django.utils.timezone import localtime, make_aware
+
+from . import customsettings
+from .models import Transaction, DailyRollup, CustomerDailyRollup
+from .money import to_pence, from_pence
+
+
+# number of rollup rows written to the database at a time when rebuilding
+ROLLUP_BATCH_SIZE = 500
+
+# number of rows each day's site-wide total for a type is spread over
+ROLLUP_SHARDS = 8
+
+
+def rollup_keys(transact):
+    """Returns the (day, type, customer id) rows a transaction is counted in,
+    where a customer id of None is the total across all customers"""
+    day = localtime(transact.transaction_time).date()
+    keys = [(day, transact.transaction_type, None)]
+    if getattr(customsettings, 'ROLLUP_BY_CUSTOMER', False) and transact.customer_id is not None:
+        keys.append((day, transact.transaction_type, transact.customer_id))
+    return keys
+
+
+def add_to_totals(totals, transact):
+    """Adds a transaction to a dict of rollup rows' cash totals, voucher totals
+    (both in pence) and counts"""
+    for key in rollup_keys(transact):
+        cash, voucher, count = totals.get(key, (0, 0, 0))
+        totals[key] = (
+            cash + to_pence(transact.transaction_value),
+            voucher + to_pence(transact.voucher_value),
+            count + 1,
+        )
+
+
+def group_totals(transactions):
+    """Returns each rollup row's cash total, voucher total and count for the transactions"""
+    totals = {}
+    for transact in transactions:
+        add_to_totals(totals, transact)
+    return totals
+
+
+def daily_totals(log):
+    """Yields the rollup totals of a time ordered transaction log one day at a time"""
+    day = None
+    totals = {}
+    for transact in log.only(
+            'transaction_time',
+            'transaction_type',
+            'customer',
+            'transaction_value',
+            'voucher_value',
+    ).iterator(chunk_size=ROLLUP_BATCH_SIZE):
+        transact_day = localtime(transact.transaction_time).date()
+        if totals and transact_day != day:
+            yield totals
+            totals = {}
+        day = transact_day
+        add_to_totals(totals, transact)
+    if totals:
+        yield totals
+
+
+def record_transactions(transactions):
+    """Adds newly logged transactions to their days' totals, to be called
+    in the same database transaction that logged them"""
+    shard = randrange(ROLLUP_SHARDS)
+    for (day, transaction_type, customer_id), totals in group_totals(transactions).items():
+        if customer_id is None:
+            _add_to_rollup(DailyRollup, {'shard': shard}, day, transaction_type, *totals)
+        else:
+            _add_to_rollup(
+                CustomerDailyRollup, {'customer_id': customer_id}, day, transaction_type, *totals
+            )
+
+
+def _add_to_rollup(model, key, day, transaction_type, cash, voucher, count):
+    """Adds to a rollup row's totals in the database, creating it if needed"""
+    rows = model.objects.filter(day=day, transaction_type=transaction_type, **key)
+    increment = {
+        'transaction_value': F('transaction_value') + cash,
+        'voucher_value': F('voucher_value') + voucher,
+        'transaction_count': F('transaction_count') + count,
+    }
+    if rows.update(**increment):
+        return
+
+    try:
+        with transaction.atomic():
+            model.objects.create(
+                day=day,
+                transaction_type=transaction_type,
+                transaction_value=from_pence(cash),
+                voucher_value=from_pence(voucher),
+                transaction_count=count,
+                **key
+            )
+    except IntegrityError:
+        # another till created the row first
+        rows.update(**increment)
+
+
+def rebuild_rollups(start=None, end=None):
+    """Recalculates the totals for the days between start and end inclusive
+    (or every day) from the transaction log, returning the number of rows written"""
+    rollups = DailyRollup.objects.all()
+    customer_rollups = CustomerDailyRollup.objects.all()
+    log = Transaction.objects.order_by('transaction_time')
+    if start is not None:
+        rollups = rollups.filter(day__gte=start)
+        customer_rollups = customer_rollups.filter(day__gte=start)
+        log = log.filter(transaction_time__gte=_local_midnight(start))
+    if end is not None:
+        end_time = _local_midnight(end + datetime.timedelta(days=1))
+        rollups = rollups.filter(day__lte=end)
+        customer_rollups = customer_rollups.filter(day__lte=end)
+        log = log.filter(transaction_time__lt=end_time)
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        customer_rollups.delete()
+        # the log is read in time order, so only one day's totals are held at a time
+        for totals in daily_totals(log):
+            written += _create_rollups(totals)
+
+    return written
+
+
+def _create_rollups(totals):
+    """Writes the rollup rows for one day's totals, putting each site-wide total
+    in its first shard"""
+    rows = []
+    customer_rows = []
+    for (day, transaction_type, customer_id), (cash, voucher, count) in totals.items():
+        values = {
+            'day': day,
+            'transaction_type': transaction_type,
+            'transaction_value': from_pence(cash),
+            'voucher_value': from_pence(voucher),
+            'transaction_count': count,
+        }
+        if customer_id is None:
+            rows.append(DailyRollup(shard=0, **values))
+        else:
+            customer_rows.append(CustomerDailyRollup(customer_id=customer_id, **values))
+    DailyRollup.objects.bulk_create(rows, batch_size=ROLLUP_BATCH_SIZE)
+    CustomerDailyRollup.objects.bulk_create(customer_rows, batch_size=ROLLUP_BATCH_SIZE)
+    return len(rows) + len(customer_rows)
+
+
+def _local_midnight(day):
+    """Returns the start of the day in the current time zone"""
+    return make_aware(datetime.datetime.combine(day, datetime.time.min))
@@ -0,0 +1,68 @@
+"""
+Signal handlers keeping the info dashboard's totals and the cache up to date
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Customer, Cash, Voucher
+from .counters import add_to_counters
+from .cache import invalidate, VOUCHERS
+from .cards import forget_card
+
+
+@receiver(post_save, sender=Customer)
+def count_new_customer(sender, instance, created, raw=False, **kwargs):
+    """Counts a newly created customer"""
+    if created and not raw:
+        add_to_counters(customers=1)
+
+
+@receiver(post_delete, sender=Customer)
+def count_deleted_customer(sender, instance, **kwargs):
+    """Removes a deleted customer from the count"""
+    add_to_counters(customers=-1)
+
+
+@receiver(post_save, sender=Cash)
+def count_new_account(sender, instance, created, raw=False, **kwargs):
+    """Counts a newly created cash account and its opening balances"""
+    if created and not raw:
+        add_to_counters(
+            accounts=1,
+            cash=instance.cash_value.amount,
+            voucher=instance.voucher_value.amount,
+        )
+
+
+@receiver(post_delete, sender=Cash)
+def count_deleted_account(sender, instance, **kwargs):
+    """Removes a deleted cash account and its balances from the totals"""
+    add_to_counters(
+        accounts=-1,
+        cash=-instance.cash_value.amount,
+        voucher=-instance.voucher_value.amount,
+    )
+
+
+@receiver(post_save, sender=Voucher)
+@receiver(post_delete, sender=Voucher)
+def invalidate_vouchers(sender, **kwargs):
+    """Discards cached voucher details when a voucher changes"""
+    invalidate(VOUCHERS)
+
+
+@receiver(pre_save, sender=Customer)
+def forget_previous_card(sender, instance, raw=False, **kwargs):
+    """Drops the card number a customer is moving off from the lookup caches"""
+    if instance.pk is None or raw:
+        return
+    previous = Customer.objects.filter(pk=instance.pk).values_list('card_number', flat=True).first()
+    if previous is not None and previous != instance.card_number:
+        forget_card(previous)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def forget_customer_card(sender, instance, **kwargs):
+    """Drops a changed customer's card number from the lookup caches"""
+    forget_card(instance.card_number)
@@ -0,0 +1,53 @@
+from unittest import mock
+from django.test import TestCase
+from djmoney.money import Money
+
+from cashless import customsettings
+from cashless.cache import cache_aside, invalidate, namespace_version, VOUCHERS
+from cashless.models import Voucher
+from cashless.voucherhandler import voucher_definitions
+
+
+class CacheAsideTest(TestCase):
+    """Tests the versioned cache-aside helpers"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        # start each test with an empty namespace
+        invalidate('test')
+
+    def test_cache_aside(self):
+        """A value is computed once and then read from the cache"""
+        compute = mock.Mock(return_value=[1, 2])
+        self.assertEqual(cache_aside('test', 'key', compute), [1, 2])
+        self.assertEqual(cache_aside('test', 'key', compute), [1, 2])
+        self.assertEqual(compute.call_count, 1)
+
+    def test_invalidate(self):
+        """Invalidating a namespace moves it to a new version, so values are recomputed"""
+        version = namespace_version('test')
+        compute = mock.Mock(return_value='value')
+        cache_aside('test', 'key', compute)
+        invalidate('test')
+        self.assertNotEqual(namespace_version('test'), version)
+        cache_aside('test', 'key', compute)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_voucher_signals(self):
+        """Saving or deleting a voucher discards the cached voucher details"""
+        test_voucher = Voucher.objects.create(
+            voucher_application="daily",
+            voucher_name="free breakfast",
+            voucher_value=Money(2, customsettings.CURRENCY),
+        )
+        self.assertEqual(voucher_definitions()[test_voucher.pk], ("daily", Money(2, customsettings.CURRENCY)))
+        with self.assertNumQueries(0):
+            voucher_definitions()
+
+        test_voucher.voucher_value = Money(3, customsettings.CURRENCY)
+        test_voucher.save()
+        self.assertEqual(voucher_definitions()[test_voucher.pk][1], Money(3, customsettings.CURRENCY))
+
+        version = namespace_version(VOUCHERS)
+        test_voucher.delete()
+        self.assertNotEqual(namespace_version(VOUCHERS), version)
+        self.assertNotIn(test_voucher.pk, voucher_definitions())
@@ -0,0 +1,62 @@
+from django.test import TestCase
+
+from cashless.cards import card_customer_id, find_customer, forget_card, _remember_card
+from cashless.models import Customer, Cash
+
+
+class CardLookupTest(TestCase):
+    """Tests looking up customers by card number"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        self.test_customer = Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+        Cash.objects.create(customer_id=self.test_customer.pk)
+
+    def test_warm_lookup(self):
+        """A known card resolves without a query, then loads in one"""
+        self.assertEqual(card_customer_id(99), self.test_customer.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(card_customer_id(99), self.test_customer.pk)
+        with self.assertNumQueries(1):
+            customer = find_customer(99)
+            self.assertEqual(customer.cash.customer_id, self.test_customer.pk)
+
+    def test_unknown_card(self):
+        """An unknown card isn't found"""
+        self.assertIsNone(card_customer_id(12345))
+        with self.assertRaises(Customer.DoesNotExist):
+            find_customer(12345)
+
+    def test_card_changed(self):
+        """Changing a customer's card number drops it from the caches"""
+        card_customer_id(99)
+        self.test_customer.card_number = 100
+        self.test_customer.save()
+        self.assertIsNone(card_customer_id(99))
+        self.assertEqual(find_customer(100).pk, self.test_customer.pk)
+
+    def test_text_card_number(self):
+        """A card looked up as text is forgotten when the customer changes"""
+        self.assertEqual(card_customer_id('99'), self.test_customer.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(card_customer_id(99), self.test_customer.pk)
+        self.test_customer.delete()
+        self.assertIsNone(card_customer_id('99'))
+        with self.assertRaises(Customer.DoesNotExist):
+            find_customer('99')
+
+    def test_stale_entry(self):
+        """An out of date entry left by another process is caught and replaced"""
+        other_customer = Customer.objects.create(
+            card_number=98,
+            first_name='Jane',
+            surname='Smith',
+        )
+        Cash.objects.create(customer_id=other_customer.pk)
+        forget_card(98)
+        _remember_card(98, self.test_customer.pk)
+        self.assertEqual(find_customer(98).pk, other_customer.pk)
+        self.assertEqual(card_customer_id(98), other_customer.pk)
@@ -0,0 +1,112 @@
+from datetime import timedelta, date
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from djmoney.money import Money
+
+from cashless import customsettings
+from cashless.models import Voucher, Customer, Cash, VoucherLink, DailyRollup
+from cashless.posting import post_credit, post_debit
+from cashless.ledger import reconcile_accounts
+
+
+class ResetVouchersCommandTest(TestCase):
+    """Tests the reset vouchers management command"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        test_customer = Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+        Cash.objects.create(
+            customer_id=test_customer.pk,
+            cash_value=Money(2, customsettings.CURRENCY),
+            voucher_value=Money(0, customsettings.CURRENCY),
+        )
+        test_voucher = Voucher.objects.create(
+            voucher_application="daily",
+            voucher_name="free breakfast",
+            voucher_value=Money(5, customsettings.CURRENCY),
+        )
+        VoucherLink.objects.create(
+            customer_id=test_customer.pk,
+            voucher_id=test_voucher.pk,
+            last_applied=date.today()-timedelta(days=1),
+        )
+
+    def test_command_resets_vouchers(self):
+        """The command credits due vouchers and reports the accounts reset"""
+        out = StringIO()
+        call_command('reset_vouchers', stdout=out)
+        cash = Cash.objects.get(customer__card_number=99)
+        self.assertEqual(cash.voucher_value, Money(5, customsettings.CURRENCY))
+        self.assertIn("1 customer accounts", out.getvalue())
+
+
+class ReconcileCommandTest(TestCase):
+    """Tests the reconcile management command"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        for card in (99, 98):
+            test_customer = Customer.objects.create(
+                card_number=card,
+                first_name='John',
+                surname='Smith',
+            )
+            Cash.objects.create(customer_id=test_customer.pk)
+            post_credit(test_customer.pk, Money(5, customsettings.CURRENCY))
+            post_debit(test_customer.pk, Money(2, customsettings.CURRENCY))
+
+    def test_balances_match(self):
+        """Accounts posted through the posting service reconcile"""
+        out = StringIO()
+        call_command('reconcile', stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Checked 2 accounts, 0 mismatched")
+
+    def test_balance_mismatch(self):
+        """An account changed outside the log is reported"""
+        test_customer = Customer.objects.get(card_number=98)
+        Cash.objects.filter(customer_id=test_customer.pk).update(cash_value=Money(10, customsettings.CURRENCY))
+        out = StringIO()
+        call_command('reconcile', chunk_size=1, stdout=out)
+        self.assertIn(
+            "Customer " + str(test_customer.pk)
+            + ": cash " + str(Money(10, customsettings.CURRENCY))
+            + " logged " + str(Money(3, customsettings.CURRENCY)),
+            out.getvalue(),
+        )
+        self.assertIn("Checked 2 accounts, 1 mismatched", out.getvalue())
+
+    def test_reconcile_by_range(self):
+        """Reconciling one customer at a time checks every account once"""
+        accounts = Cash.objects.order_by('customer_id')
+        first_id = accounts.first().customer_id
+        last_id = accounts.last().customer_id
+        checked = 0
+        for customer_id in range(first_id, last_id + 1):
+            range_checked, mismatches = reconcile_accounts(customer_id, customer_id)
+            checked += range_checked
+            self.assertEqual(mismatches, [])
+        self.assertEqual(checked, 2)
+
+
+class RebuildRollupsCommandTest(TestCase):
+    """Tests the rebuild rollups management command"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        test_customer = Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+        Cash.objects.create(customer_id=test_customer.pk)
+        post_credit(test_customer.pk, Money(5, customsettings.CURRENCY))
+        DailyRollup.objects.all().delete()
+
+    def test_rebuild(self):
+        """The command writes the totals from the log"""
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Wrote 1 daily totals")
+        self.assertEqual(DailyRollup.objects.get().transaction_count, 1)
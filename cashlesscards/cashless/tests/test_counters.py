@@ -0,0 +1,87 @@
+from unittest import mock
+from django.test import TestCase
+from djmoney.money import Money
+
+from cashless import customsettings
+from cashless.models import Customer, Cash, Voucher, VoucherLink, SystemCounter
+from cashless.counters import read_counters, rebuild_counters, CUSTOMERS, ACCOUNTS, CASH, VOUCHER
+from cashless.posting import post_credit, post_debit
+from cashless.voucherhandler import propagate_voucher_value
+
+
+class SystemCounterTest(TestCase):
+    """Tests the running totals shown on the info page"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        self.test_customer = Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+        Cash.objects.create(
+            customer_id=self.test_customer.pk,
+            cash_value=Money(10, customsettings.CURRENCY),
+            voucher_value=Money(2, customsettings.CURRENCY),
+        )
+
+    def assertCountersMatchTables(self):
+        """The running totals equal a fresh count of the tables"""
+        counters = read_counters()
+        self.assertEqual(counters, rebuild_counters())
+
+    def test_create_customer(self):
+        """New customers and accounts are counted with their opening balances"""
+        counters = read_counters()
+        self.assertEqual(counters[CUSTOMERS], 1)
+        self.assertEqual(counters[ACCOUNTS], 1)
+        self.assertEqual(counters[CASH], 10)
+        self.assertEqual(counters[VOUCHER], 2)
+
+    def test_delete_customer(self):
+        """Deleting a customer removes them and their account from the totals"""
+        self.test_customer.delete()
+        counters = read_counters()
+        self.assertEqual(counters[CUSTOMERS], 0)
+        self.assertEqual(counters[ACCOUNTS], 0)
+        self.assertEqual(counters[CASH], 0)
+
+    def test_posting(self):
+        """Credits and debits move the cash and voucher totals"""
+        post_credit(self.test_customer.pk, Money(5, customsettings.CURRENCY))
+        post_debit(self.test_customer.pk, Money(4, customsettings.CURRENCY))
+        counters = read_counters()
+        self.assertEqual(counters[CASH], 13)
+        self.assertEqual(counters[VOUCHER], 0)
+        self.assertCountersMatchTables()
+
+    def test_propagate_voucher(self):
+        """Voucher balance changes move the voucher total"""
+        test_voucher = Voucher.objects.create(
+            voucher_application="daily",
+            voucher_name="free breakfast",
+            voucher_value=Money(3, customsettings.CURRENCY),
+        )
+        VoucherLink.objects.create(
+            customer_id=self.test_customer.pk,
+            voucher_id=test_voucher.pk,
+            voucher_value=Money(2, customsettings.CURRENCY),
+        )
+        propagate_voucher_value(test_voucher, Money(2, customsettings.CURRENCY))
+        self.assertEqual(read_counters()[VOUCHER], 3)
+        self.assertCountersMatchTables()
+
+    def test_spread_across_shards(self):
+        """Changes land on different shards but read back as one total"""
+        with mock.patch('cashless.counters.random.randrange', side_effect=[1, 2]):
+            post_credit(self.test_customer.pk, Money(1, customsettings.CURRENCY))
+            post_credit(self.test_customer.pk, Money(1, customsettings.CURRENCY))
+        shards = SystemCounter.objects.filter(name=CASH).values_list('shard', flat=True)
+        self.assertTrue({1, 2} <= set(shards))
+        self.assertEqual(read_counters()[CASH], 12)
+
+    def test_info_page(self):
+        """The info page shows the running totals"""
+        response = self.client.get('/cashless/info')
+        self.assertEqual(response.context['num_customers'], 1)
+        self.assertEqual(response.context['sum_cash'], '10.00')
+        self.assertEqual(response.context['sum_voucher'], '2.00')
@@ -0,0 +1,147 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import TestCase
+from djmoney.money import Money
+
+from cashless import customsettings
+from cashless.db import check_connections, apply_pragmas, lock_rows
+from cashless.models import Customer, Cash
+from cashless.money import to_pence
+
+
+class ApplyPragmasTest(TestCase):
+    """Tests the pragmas applied to new SQLite connections"""
+    def test_wal_profile(self):
+        """A new connection to a SQLite file is set up with its pragmas"""
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        test_db = DatabaseWrapper(dict(
+            connection.settings_dict,
+            NAME=os.path.join(folder.name, 'test.sqlite3'),
+            PRAGMAS={
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 5000,
+            },
+        ))
+        self.addCleanup(test_db.close)
+        with test_db.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute("PRAGMA synchronous")
+            # NORMAL is reported as 1
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_no_pragmas(self):
+        """A connection with no pragmas configured is left as it is"""
+        with mock.patch.object(connection, 'cursor') as cursor:
+            apply_pragmas(sender=None, connection=connection)
+        cursor.assert_not_called()
+
+    def test_other_databases(self):
+        """Pragmas are only applied to SQLite connections"""
+        with mock.patch.dict(connection.settings_dict, {'PRAGMAS': {'synchronous': 'NORMAL'}}), \
+                mock.patch.object(connection, 'vendor', 'mysql'), \
+                mock.patch.object(connection, 'cursor') as cursor:
+            apply_pragmas(sender=None, connection=connection)
+        cursor.assert_not_called()
+
+
+class LockRowsTest(TestCase):
+    """Tests locking rows for update"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        # a second database in a WAL file, which each thread connects to separately
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        databases = mock.patch.dict(connections.databases, {'wal': dict(
+            connection.settings_dict,
+            NAME=os.path.join(folder.name, 'wal.sqlite3'),
+            PRAGMAS={'journal_mode': 'WAL', 'busy_timeout': 5000},
+        )})
+        databases.start()
+        self.addCleanup(databases.stop)
+        self.addCleanup(self.close_wal)
+        with connections['wal'].schema_editor() as editor:
+            editor.create_model(Customer)
+            editor.create_model(Cash)
+        Customer.objects.using('wal').bulk_create([
+            Customer(pk=1, card_number=99, first_name='John', surname='Smith'),
+        ])
+        Cash.objects.using('wal').bulk_create([Cash(pk=1, customer_id=1)])
+
+    def close_wal(self):
+        """Close this thread's connection to the WAL file"""
+        connections['wal'].close()
+        del connections['wal']
+
+    def test_other_writer_waits(self):
+        """A write made while the rows are locked waits for the lock to be released
+        rather than making the locking transaction fail"""
+        errors = []
+
+        def credit():
+            """Add to the balance from another connection"""
+            try:
+                Cash.objects.using('wal').filter(pk=1).update(cash_value=F('cash_value') + 100)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections['wal'].close()
+
+        with transaction.atomic(using='wal'):
+            cash_inst = lock_rows(Cash.objects.using('wal').filter(pk=1)).get()
+            writer = threading.Thread(target=credit)
+            writer.start()
+            # give the other connection time to try its write
+            time.sleep(0.2)
+            Cash.objects.using('wal').filter(pk=1).update(cash_value=to_pence(cash_inst.cash_value) + 50)
+        writer.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Cash.objects.using('wal').get(pk=1).cash_value, Money(1.5, customsettings.CURRENCY))
+
+
+class CheckConnectionsTest(TestCase):
+    """Tests the health check of kept database connections"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        connection.ensure_connection()
+
+    def test_dropped_connection_closed(self):
+        """A kept connection the database has dropped is closed"""
+        with mock.patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 60}), \
+                mock.patch.object(connection, 'is_usable', return_value=False), \
+                mock.patch.object(connection, 'close') as close:
+            check_connections()
+        close.assert_called_once_with()
+
+    def test_usable_connection_kept(self):
+        """A kept connection that's still usable is left open"""
+        with mock.patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 60}), \
+                mock.patch.object(connection, 'is_usable', return_value=True), \
+                mock.patch.object(connection, 'close') as close:
+            check_connections()
+        close.assert_not_called()
+
+    def test_connections_not_kept(self):
+        """Connections aren't checked when they're not kept between requests"""
+        with mock.patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 0}), \
+                mock.patch.object(connection, 'is_usable') as is_usable:
+            check_connections()
+        is_usable.assert_not_called()
+
+    def test_checked_on_request(self):
+        """Connections are checked at the start of each request"""
+        with mock.patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 60}), \
+                mock.patch.object(connection, 'is_usable', return_value=True) as is_usable:
+            self.client.get('/cashless/')
+        is_usable.assert_called_once_with()
@@ -110,47 +110,39 @@ class AddVoucherLinkFormTest(TestCase):
 
     def test_voucher_field_label(self):
         """The field label of the voucher field is as expected"""
-        # get test voucher link details
-        existing_vouchers = VoucherLink.objects.get(pk=1)
         # test instance
-        form = AddVoucherLinkForm(existing_vouchers=existing_vouchers)
+        form = AddVoucherLinkForm(customer_id=1)
         self.assertTrue(form.fields['voucher'].label is None \
         or form.fields['voucher'].label == 'voucher')
 
     def test_voucher_field_help_text(self):
         """The help text of the voucher field is as expected"""
-        # get test voucher link details
-        existing_vouchers = VoucherLink.objects.get(pk=1)
         # test instance
-        form = AddVoucherLinkForm(existing_vouchers=existing_vouchers)
+        form = AddVoucherLinkForm(customer_id=1)
         self.assertEqual(form.fields['voucher'].help_text, \
         'Select a voucher to assign to this customer.')
 
     def test_voucher_is_none(self):
         """The form rejects a null value"""
-        # get test voucher link details
-        existing_vouchers = VoucherLink.objects.get(pk=1)
         # test instance
         no_voucher = None
         form = AddVoucherLinkForm(
             data={
                 'voucher': no_voucher
             },
-            existing_vouchers=existing_vouchers
+            customer_id=1
         )
         self.assertFalse(form.is_valid())
 
     def test_voucher_already_assigned(self):
         """The form rejects a voucher assignment that already exists"""
-        # get test voucher link details
-        existing_vouchers = VoucherLink.objects.get(pk=1)
         # test instance
         existing_assignment = 1
         form = AddVoucherLinkForm(
             data={
                 'voucher': existing_assignment
             },
-            existing_vouchers=existing_vouchers
+            customer_id=1
         )
         self.assertFalse(form.is_valid())
 
@@ -169,62 +161,48 @@ class CreateNewVoucherFormTest(TestCase):
 
     def test_application_field_lable(self):
         """The field label of the application field is as expected"""
-        # get test voucher details
-        existing_vouchers = Voucher.objects.get(pk=1)
         # test instance
-        form = CreateNewVoucherForm(existing_vouchers=existing_vouchers)
+        form = CreateNewVoucherForm()
         self.assertTrue(form.fields['application'].label is None\
         or form.fields['application'].label == 'application')
 
     def test_name_field_lable(self):
         """The field label of the name field is as expected"""
-        # get test voucher details
-        existing_vouchers = Voucher.objects.get(pk=1)
         # test instance
-        form = CreateNewVoucherForm(existing_vouchers=existing_vouchers)
+        form = CreateNewVoucherForm()
         self.assertTrue(form.fields['name'].label is None\
         or form.fields['name'].label == 'name')
 
     def test_value_field_lable(self):
         """The field label of the value field is as expected"""
-        # get test voucher details
-        existing_vouchers = Voucher.objects.get(pk=1)
         # test instance
-        form = CreateNewVoucherForm(existing_vouchers=existing_vouchers)
+        form = CreateNewVoucherForm()
         self.assertTrue(form.fields['value'].label is None\
         or form.fields['value'].label == 'value')
 
     def test_application_field_help_text(self):
         """The help text of the application field is as expected"""
-        # get test voucher details
-        existing_vouchers = Voucher.objects.get(pk=1)
         # test instance
-        form = CreateNewVoucherForm(existing_vouchers=existing_vouchers)
+        form = CreateNewVoucherForm()
         self.assertEqual(form.fields['application'].help_text, \
         "Select how often the voucher is applied to the customer's account.")
 
     def test_name_field_help_text(self):
         """The help text of the name field is as expected"""
-        # get test voucher details
-        existing_vouchers = Voucher.objects.get(pk=1)
         # test instance
-        form = CreateNewVoucherForm(existing_vouchers=existing_vouchers)
+        form = CreateNewVoucherForm()
         self.assertEqual(form.fields['name'].help_text, \
         "Give the voucher a unique name.")
 
     def test_value_field_help_text(self):
         """The help text of the value field is as expected"""
-        # get test voucher details
-        existing_vouchers = Voucher.objects.get(pk=1)
         # test instance
-        form = CreateNewVoucherForm(existing_vouchers=existing_vouchers)
+        form = CreateNewVoucherForm()
         self.assertEqual(form.fields['value'].help_text, \
         'Select the cash value for the voucher.')
 
     def test_application_is_none(self):
         """The form rejects a null value in the application field"""
-        # get test voucher details
-        existing_vouchers = Voucher.objects.get(pk=1)
         # test instance
         test_application = None
         test_name = 'test'
@@ -234,15 +212,12 @@ class CreateNewVoucherFormTest(TestCase):
                 'application': test_application,
                 'name': test_name,
                 'value': test_value,
-            },
-            existing_vouchers=existing_vouchers
+            }
         )
         self.assertFalse(form.is_valid())
 
     def test_name_is_none(self):
         """The form rejects a null value in the name field"""
-        # get test voucher details
-        existing_vouchers = Voucher.objects.get(pk=1)
         # test instance
         test_application = 'daily'
         test_name = None
@@ -252,15 +227,12 @@ class CreateNewVoucherFormTest(TestCase):
                 'application': test_application,
                 'name': test_name,
                 'value': test_value,
-            },
-            existing_vouchers=existing_vouchers
+            }
         )
         self.assertFalse(form.is_valid())
 
     def test_name_exists(self):
         """The form rejects a name that already exists"""
-        # get test voucher details
-        existing_vouchers = Voucher.objects.get(pk=1)
         # test instance
         test_application = 'daily'
         test_name = 'test'
@@ -270,23 +242,33 @@ class CreateNewVoucherFormTest(TestCase):
                 'application': test_application,
                 'name': test_name,
                 'value': test_value,
-            },
-            existing_vouchers=existing_vouchers
+            }
         )
         form = CreateNewVoucherForm(
             data={
                 'application': test_application,
                 'name': test_name,
                 'value': test_value,
-            },
-            existing_vouchers=existing_vouchers
+            }
         )
         self.assertFalse(form.is_valid())
 
+    def test_name_exists_error(self):
+        """The form reports a name that already exists against the name field"""
+        form = CreateNewVoucherForm(
+            data={
+                'application': 'daily',
+                'name': 'test',
+                'value_0': 1,
+                'value_1': customsettings.CURRENCY,
+            }
+        )
+        with self.assertNumQueries(1):
+            self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['name'], ['Invalid value - voucher already exists'])
+
     def test_value_is_zero(self):
         """The form rejects a value of zero"""
-        # get test voucher details
-        existing_vouchers = Voucher.objects.get(pk=1)
         # test instance
         test_application = 'daily'
         test_name = 'test'
@@ -296,15 +278,12 @@ class CreateNewVoucherFormTest(TestCase):
                 'application': test_application,
                 'name': test_name,
                 'value': test_value,
-            },
-            existing_vouchers=existing_vouchers
+            }
         )
         self.assertFalse(form.is_valid())
 
     def test_cash_to_deduct_is_negative(self):
         """The form rejects negative values"""
-        # get test voucher details
-        existing_vouchers = Voucher.objects.get(pk=1)
         # test instance
         test_application = 'daily'
         test_name = 'test'
@@ -314,8 +293,7 @@ class CreateNewVoucherFormTest(TestCase):
                 'application': test_application,
                 'name': test_name,
                 'value': test_value,
-            },
-            existing_vouchers=existing_vouchers
+            }
         )
         self.assertFalse(form.is_valid())
 
@@ -340,59 +318,34 @@ class CreateNewCustomerFormTest(TestCase):
 
     def test_card_number_field_lable(self):
         """The field label of the card number field is as expected"""
-        # get test customer details
-        cust_inst = Customer.objects.all()
-        existing_cards = []
-        for cust in cust_inst:
-            existing_cards.append(cust.card_number)
         # test instance
-        form = CreateNewCustomerForm(existing_cards=existing_cards)
+        form = CreateNewCustomerForm()
         self.assertTrue(form.fields['card_number'].label is None\
         or form.fields['card_number'].label == 'card number')
 
     def test_first_name_field_lable(self):
         """The field label of the first name field is as expected"""
-        # get test customer details
-        cust_inst = Customer.objects.all()
-        existing_cards = []
-        for cust in cust_inst:
-            existing_cards.append(cust.card_number)
         # test instance
-        form = CreateNewCustomerForm(existing_cards=existing_cards)
+        form = CreateNewCustomerForm()
         self.assertTrue(form.fields['first_name'].label is None\
         or form.fields['first_name'].label == 'first name')
 
     def test_surname_field_lable(self):
         """The field label of the surname field is as expected"""
-        # get test customer details
-        cust_inst = Customer.objects.all()
-        existing_cards = []
-        for cust in cust_inst:
-            existing_cards.append(cust.card_number)
         # test instance
-        form = CreateNewCustomerForm(existing_cards=existing_cards)
+        form = CreateNewCustomerForm()
         self.assertTrue(form.fields['surname'].label is None\
         or form.fields['surname'].label == 'surname')
 
     def test_opening_balance_field_lable(self):
         """The field label of the opening balance field is as expected"""
-        # get test customer details
-        cust_inst = Customer.objects.all()
-        existing_cards = []
-        for cust in cust_inst:
-            existing_cards.append(cust.card_number)
         # test instance
-        form = CreateNewCustomerForm(existing_cards=existing_cards)
+        form = CreateNewCustomerForm()
         self.assertTrue(form.fields['opening_balance'].label is None\
         or form.fields['opening_balance'].label == 'opening balance')
 
     def test_first_name_is_none(self):
         """The form rejects a null value in the first name field"""
-        # get test customer details
-        cust_inst = Customer.objects.all()
-        existing_cards = []
-        for cust in cust_inst:
-            existing_cards.append(cust.card_number)
         # test instance
         test_first_name = None
         test_surname = 'test'
@@ -404,18 +357,12 @@ class CreateNewCustomerFormTest(TestCase):
                 'surname': test_surname,
                 'card_number': test_card_number,
                 'opening_balance': test_opening_balance,
-            },
-            existing_cards=existing_cards
+            }
         )
         self.assertFalse(form.is_valid())
 
     def test_surname_is_none(self):
         """The form rejects a null value in the surname field"""
-        # get test customer details
-        cust_inst = Customer.objects.all()
-        existing_cards = []
-        for cust in cust_inst:
-            existing_cards.append(cust.card_number)
         # test instance
         test_first_name = 'test'
         test_surname = None
@@ -427,22 +374,16 @@ class CreateNewCustomerFormTest(TestCase):
                 'surname': test_surname,
                 'card_number': test_card_number,
                 'opening_balance': test_opening_balance,
-            },
-            existing_cards=existing_cards
+            }
         )
         self.assertFalse(form.is_valid())
 
     def test_card_number_exists(self):
         """The form rejects a card number that already exists"""
-        # get test customer details
-        cust_inst = Customer.objects.all()
-        existing_cards = []
-        for cust in cust_inst:
-            existing_cards.append(cust.card_number)
         # test instance
         test_first_name = 'test'
         test_surname = 'test'
-        test_card_number = 1
+        test_card_number = 99
         test_opening_balance = Money(1, customsettings.CURRENCY)
         form = CreateNewCustomerForm(
             data={
@@ -450,8 +391,7 @@ class CreateNewCustomerFormTest(TestCase):
                 'surname': test_surname,
                 'card_number': test_card_number,
                 'opening_balance': test_opening_balance,
-            },
-            existing_cards=existing_cards
+            }
         )
         form = CreateNewCustomerForm(
             data={
@@ -459,18 +399,12 @@ class CreateNewCustomerFormTest(TestCase):
                 'surname': test_surname,
                 'card_number': test_card_number,
                 'opening_balance': test_opening_balance,
-            },
-            existing_cards=existing_cards
+            }
         )
         self.assertFalse(form.is_valid())
 
     def test_card_number_is_zero(self):
         """The form rejects a card number of zero"""
-        # get test customer details
-        cust_inst = Customer.objects.all()
-        existing_cards = []
-        for cust in cust_inst:
-            existing_cards.append(cust.card_number)
         # test instance
         test_first_name = 'test'
         test_surname = 'test'
@@ -482,18 +416,12 @@ class CreateNewCustomerFormTest(TestCase):
                 'surname': test_surname,
                 'card_number': test_card_number,
                 'opening_balance': test_opening_balance,
-            },
-            existing_cards=existing_cards
+            }
         )
         self.assertFalse(form.is_valid())
 
     def test_opening_balance_is_negative(self):
         """The form rejects negative values"""
-        # get test customer details
-        cust_inst = Customer.objects.all()
-        existing_cards = []
-        for cust in cust_inst:
-            existing_cards.append(cust.card_number)
         # test instance
         test_first_name = 'test'
         test_surname = 'test'
@@ -505,7 +433,37 @@ class CreateNewCustomerFormTest(TestCase):
                 'surname': test_surname,
                 'card_number': test_card_number,
                 'opening_balance': test_opening_balance,
-            },
-            existing_cards=existing_cards
+            }
         )
         self.assertFalse(form.is_valid())
+
+    def test_card_number_exists_error(self):
+        """The form reports a card number that already exists against the card number field"""
+        form = CreateNewCustomerForm(
+            data={
+                'first_name': 'test',
+                'surname': 'test',
+                'card_number': 99,
+                'opening_balance_0': 1,
+                'opening_balance_1': customsettings.CURRENCY,
+            }
+        )
+        with self.assertNumQueries(1):
+            self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors['card_number'],
+            ['Invalid value - a card with this number already exists on the system']
+        )
+
+    def test_new_card_number(self):
+        """The form accepts a card number that isn't in use"""
+        form = CreateNewCustomerForm(
+            data={
+                'first_name': 'test',
+                'surname': 'test',
+                'card_number': 1,
+                'opening_balance_0': 1,
+                'opening_balance_1': customsettings.CURRENCY,
+            }
+        )
+        self.assertTrue(form.is_valid())
@@ -0,0 +1,67 @@
+from datetime import timedelta
+from django.test import TestCase
+from django.utils.timezone import now
+from djmoney.money import Money
+
+from cashless import customsettings
+from cashless.models import Customer, Transaction, BalanceSnapshot
+from cashless.ledger import balance_as_of, take_snapshots
+
+
+class LedgerTest(TestCase):
+    """Tests historic balances from the transaction log"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        test_customer = Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+        self.customer_id = test_customer.pk
+        self.start = now() - timedelta(days=3)
+        # a credit of 10 cash and 5 voucher, then debits of 1 cash and 2 voucher per day
+        Transaction.objects.create(
+            customer_id=self.customer_id,
+            transaction_time=self.start,
+            transaction_type='credit',
+            transaction_value=Money(10, customsettings.CURRENCY),
+            voucher_value=Money(5, customsettings.CURRENCY),
+        )
+        for day in (1, 2, 3):
+            Transaction.objects.create(
+                customer_id=self.customer_id,
+                transaction_time=self.start + timedelta(days=day),
+                transaction_type='debit',
+                transaction_value=Money(1, customsettings.CURRENCY),
+                voucher_value=Money(2, customsettings.CURRENCY) if day < 3 else Money(0, customsettings.CURRENCY),
+            )
+
+    def test_balance_without_snapshot(self):
+        """A balance is summed from the whole log when there's no snapshot"""
+        cash, voucher = balance_as_of(self.customer_id, self.start + timedelta(days=2))
+        self.assertEqual(cash, Money(8, customsettings.CURRENCY))
+        self.assertEqual(voucher, Money(1, customsettings.CURRENCY))
+
+    def test_snapshot_matches_log(self):
+        """A snapshot records the balance at its checkpoint"""
+        taken = take_snapshots(self.start + timedelta(days=1, hours=1))
+        snapshot = BalanceSnapshot.objects.get()
+        self.assertEqual(taken, 1)
+        self.assertEqual(snapshot.cash_value, Money(9, customsettings.CURRENCY))
+        self.assertEqual(snapshot.voucher_value, Money(3, customsettings.CURRENCY))
+
+    def test_snapshots_carry_forward(self):
+        """Each snapshot builds on the one before"""
+        take_snapshots(self.start + timedelta(days=1, hours=1))
+        take_snapshots(self.start + timedelta(days=2, hours=1))
+        snapshot = BalanceSnapshot.objects.order_by('-taken_at').first()
+        self.assertEqual(snapshot.cash_value, Money(8, customsettings.CURRENCY))
+        self.assertEqual(snapshot.voucher_value, Money(1, customsettings.CURRENCY))
+
+    def test_balance_from_snapshot(self):
+        """A balance after a snapshot only reads the transactions since it"""
+        take_snapshots(self.start + timedelta(days=1, hours=1))
+        Transaction.objects.filter(transaction_time__lte=self.start + timedelta(days=1)).delete()
+        cash, voucher = balance_as_of(self.customer_id, self.start + timedelta(days=3))
+        self.assertEqual(cash, Money(7, customsettings.CURRENCY))
+        self.assertEqual(voucher, Money(1, customsettings.CURRENCY))
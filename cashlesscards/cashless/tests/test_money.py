@@ -0,0 +1,78 @@
+from decimal import Decimal
+from django.db import connection
+from django.db.models import F, Sum
+from django.test import TestCase
+from djmoney.money import Money
+
+from cashless import customsettings
+from cashless.models import Customer, Cash
+from cashless.money import to_pence, from_pence
+
+
+class PenceMoneyTest(TestCase):
+    """Tests money stored as whole pence"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        self.test_customer = Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+        Cash.objects.create(
+            customer_id=self.test_customer.pk,
+            cash_value=Money('12.34', customsettings.CURRENCY),
+            voucher_value=Money('0.10', customsettings.CURRENCY),
+        )
+
+    def test_conversions(self):
+        """Amounts convert to and from whole pence"""
+        self.assertEqual(to_pence(Money('12.34', customsettings.CURRENCY)), 1234)
+        self.assertEqual(to_pence(Decimal('-0.05')), -5)
+        self.assertEqual(from_pence(1234), Money('12.34', customsettings.CURRENCY))
+        self.assertEqual(str(from_pence(500).amount), '5.00')
+
+    def test_other_currency(self):
+        """Money in another currency can't be stored"""
+        other = 'USD' if customsettings.CURRENCY != 'USD' else 'EUR'
+        with self.assertRaises(ValueError):
+            to_pence(Money(1, other))
+
+    def test_stored_as_pence(self):
+        """Balances are stored as whole pence and read back as Money"""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT cash_value, voucher_value FROM cashless_cash")
+            self.assertEqual(cursor.fetchone(), (1234, 10))
+        test_cash = Cash.objects.get(customer_id=self.test_customer.pk)
+        self.assertEqual(test_cash.cash_value, Money('12.34', customsettings.CURRENCY))
+        self.assertEqual(test_cash.voucher_value, Money('0.10', customsettings.CURRENCY))
+
+    def test_new_object_default(self):
+        """A new object's balance defaults to zero Money"""
+        self.assertEqual(Cash().cash_value, Money(0, customsettings.CURRENCY))
+
+    def test_filter_and_update(self):
+        """Money can be compared against and pence added in the database"""
+        self.assertTrue(Cash.objects.filter(
+            cash_value__gte=Money(12, customsettings.CURRENCY)
+        ).exists())
+        Cash.objects.update(cash_value=F('cash_value') + 66)
+        test_cash = Cash.objects.get(customer_id=self.test_customer.pk)
+        self.assertEqual(test_cash.cash_value, Money(13, customsettings.CURRENCY))
+
+    def test_sum(self):
+        """Sums are totalled in pence and read back as Money"""
+        totals = Cash.objects.aggregate(cash=Sum('cash_value'), voucher=Sum('voucher_value'))
+        self.assertEqual(totals['cash'], Money('12.34', customsettings.CURRENCY))
+        self.assertEqual(totals['voucher'], Money('0.10', customsettings.CURRENCY))
+
+    def test_form_field(self):
+        """The field is edited as Money in the deployment's currency"""
+        form_field = Cash._meta.get_field('cash_value').formfield()
+        self.assertEqual(
+            form_field.clean(['2.50', customsettings.CURRENCY]),
+            Money('2.50', customsettings.CURRENCY)
+        )
+        self.assertEqual(
+            form_field.fields[1].choices,
+            [(customsettings.CURRENCY, customsettings.CURRENCY)]
+        )
@@ -0,0 +1,83 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.contrib.auth.models import User, Permission
+from django.utils.timezone import now
+from djmoney.money import Money
+
+from cashless import customsettings
+from cashless.models import Customer, Cash, Transaction
+
+
+class KeysetPaginationTest(TestCase):
+    """Tests keyset pagination of the customer list and transaction log"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        test_user = User.objects.create_user(
+            username='testuser1',
+            password='1X<ISRUkw+tuK',
+        )
+        for name in ('Create and edit customer accounts', 'Can view transaction log'):
+            test_user.user_permissions.add(Permission.objects.get(name=name))
+
+        # create customers sharing surnames so the later keys break ties
+        time = now()
+        for i in range(25):
+            test_customer = Customer.objects.create(
+                card_number=i,
+                first_name='John' if i % 2 else 'Jane',
+                surname='Smith' + str(i % 3),
+            )
+            Cash.objects.create(customer_id=test_customer.pk)
+            Transaction.objects.create(
+                customer_id=test_customer.pk,
+                transaction_time=time,
+                transaction_value=Money(i, customsettings.CURRENCY),
+            )
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def walk(self, url, context_name):
+        """Follows the next links from the first page, then the previous
+        links back, returning the pages of object ids seen each way"""
+        forwards = []
+        response = self.client.get(url)
+        while True:
+            forwards.append([item.pk for item in response.context[context_name]])
+            if not response.context['page_obj'].has_next():
+                break
+            response = self.client.get(url, {'cursor': response.context['page_obj'].next_cursor})
+
+        backwards = [forwards[-1]]
+        while response.context['page_obj'].has_previous():
+            response = self.client.get(url, {'cursor': response.context['page_obj'].previous_cursor})
+            backwards.insert(0, [item.pk for item in response.context[context_name]])
+        return forwards, backwards
+
+    def test_customer_pages(self):
+        """Every customer is listed once, in name order, in both directions"""
+        forwards, backwards = self.walk(reverse('customer_list'), 'customer_list')
+        expected = list(Customer.objects.order_by('surname', 'first_name', 'id').values_list('id', flat=True))
+        self.assertEqual(sum(forwards, []), expected)
+        self.assertEqual(forwards, backwards)
+        self.assertEqual([len(page) for page in forwards], [10, 10, 5])
+
+    def test_log_pages(self):
+        """Every transaction is listed once, newest first, even with equal times"""
+        forwards, backwards = self.walk(reverse('activity_log'), 'transaction_log')
+        expected = list(Transaction.objects.order_by('-transaction_time', '-id').values_list('id', flat=True))
+        self.assertEqual(sum(forwards, []), expected)
+        self.assertEqual(forwards, backwards)
+
+    def test_no_count_query(self):
+        """Pages are read without counting the table"""
+        response = self.client.get(reverse('customer_list'))
+        cursor = response.context['page_obj'].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('customer_list'), {'cursor': cursor})
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+
+    def test_invalid_cursor(self):
+        """A cursor that can't be read gives a page not found"""
+        response = self.client.get(reverse('customer_list'), {'cursor': 'not a cursor'})
+        self.assertEqual(response.status_code, 404)
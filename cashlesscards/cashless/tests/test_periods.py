@@ -0,0 +1,46 @@
+from datetime import date
+from django.test import SimpleTestCase
+
+from cashless.periods import period_key, period_start, current_period_start
+from cashless.periods import next_period_start, is_due
+
+
+class PeriodKeyTest(SimpleTestCase):
+    """Tests the calendar period keys"""
+    def test_keys_are_consecutive(self):
+        """Each period's key is one more than the period before"""
+        self.assertEqual(period_key("daily", date(2018, 12, 31)) + 1, period_key("daily", date(2019, 1, 1)))
+        self.assertEqual(period_key("weekly", date(2018, 9, 23)) + 1, period_key("weekly", date(2018, 9, 24)))
+        self.assertEqual(period_key("monthly", date(2018, 12, 31)) + 1, period_key("monthly", date(2019, 1, 1)))
+        self.assertEqual(period_key("yearly", date(2018, 12, 31)) + 1, period_key("yearly", date(2019, 1, 1)))
+
+    def test_week_spans_year_end(self):
+        """A week running over new year has the same key on both sides"""
+        self.assertEqual(period_key("weekly", date(2018, 12, 31)), period_key("weekly", date(2019, 1, 6)))
+        self.assertFalse(is_due("weekly", date(2018, 12, 31), date(2019, 1, 1)))
+
+    def test_same_month_next_year_is_due(self):
+        """A monthly voucher last applied a year ago is due"""
+        self.assertTrue(is_due("monthly", date(2017, 9, 26), date(2018, 9, 26)))
+
+    def test_unknown_application(self):
+        """Unknown application timings are rejected"""
+        with self.assertRaises(ValueError):
+            period_key("hourly", date(2018, 9, 26))
+
+    def test_period_start(self):
+        """Each application period starts on the expected day"""
+        day = date(2018, 9, 26) # a Wednesday
+        self.assertEqual(current_period_start("daily", day), day)
+        self.assertEqual(current_period_start("weekly", day), date(2018, 9, 24))
+        self.assertEqual(current_period_start("monthly", day), date(2018, 9, 1))
+        self.assertEqual(current_period_start("yearly", day), date(2018, 1, 1))
+        self.assertEqual(period_start("weekly", period_key("weekly", day)), date(2018, 9, 24))
+
+    def test_next_period_start(self):
+        """Each application period is followed by the expected day"""
+        day = date(2018, 12, 26) # a Wednesday
+        self.assertEqual(next_period_start("daily", day), date(2018, 12, 27))
+        self.assertEqual(next_period_start("weekly", day), date(2018, 12, 31))
+        self.assertEqual(next_period_start("monthly", day), date(2019, 1, 1))
+        self.assertEqual(next_period_start("yearly", day), date(2019, 1, 1))
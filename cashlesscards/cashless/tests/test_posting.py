@@ -0,0 +1,105 @@
+from datetime import date
+from django.test import TestCase
+from django.utils.timezone import localdate
+from djmoney.money import Money
+
+from cashless import customsettings
+from cashless.models import Voucher, Customer, Cash, VoucherLink, Transaction, DailyRollup
+from cashless.posting import post_credit, post_debit, InsufficientFunds
+from cashless.counters import rebuild_counters
+from cashless.rollups import ROLLUP_SHARDS
+
+
+class PostingTest(TestCase):
+    """Tests the posting service"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        test_customer = Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+        Cash.objects.create(
+            customer_id=test_customer.pk,
+            cash_value=Money(2, customsettings.CURRENCY),
+            voucher_value=Money(5, customsettings.CURRENCY),
+        )
+        test_voucher = Voucher.objects.create(
+            voucher_application="daily",
+            voucher_name="free breakfast",
+            voucher_value=Money(5, customsettings.CURRENCY),
+        )
+        VoucherLink.objects.create(
+            customer_id=test_customer.pk,
+            voucher_id=test_voucher.pk,
+            last_applied=date.today(),
+            voucher_value=Money(5, customsettings.CURRENCY),
+        )
+        self.customer_id = test_customer.pk
+
+    def test_credit(self):
+        """A credit is added to the cash balance and logged"""
+        post_credit(self.customer_id, Money(3, customsettings.CURRENCY))
+        test_cash = Cash.objects.get(customer_id=self.customer_id)
+        credit = Transaction.objects.get()
+        self.assertEqual(test_cash.cash_value, Money(5, customsettings.CURRENCY))
+        self.assertEqual(credit.transaction_type, "credit")
+        self.assertEqual(credit.transaction_value, Money(3, customsettings.CURRENCY))
+
+    def test_credit_without_account(self):
+        """A credit to a missing cash account is rejected"""
+        with self.assertRaises(Cash.DoesNotExist):
+            post_credit(self.customer_id + 1, Money(3, customsettings.CURRENCY))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_debit(self):
+        """A debit uses vouchers first, then cash, and is logged"""
+        post_debit(self.customer_id, Money(6, customsettings.CURRENCY))
+        test_cash = Cash.objects.get(customer_id=self.customer_id)
+        debit = Transaction.objects.get()
+        self.assertEqual(test_cash.cash_value, Money(1, customsettings.CURRENCY))
+        self.assertEqual(test_cash.voucher_value, Money(0, customsettings.CURRENCY))
+        self.assertEqual(debit.transaction_value, Money(1, customsettings.CURRENCY))
+        self.assertEqual(debit.voucher_value, Money(5, customsettings.CURRENCY))
+
+    def test_debit_more_than_available(self):
+        """A debit larger than the total balance is rejected without changes"""
+        with self.assertRaises(InsufficientFunds):
+            post_debit(self.customer_id, Money(8, customsettings.CURRENCY))
+        test_cash = Cash.objects.get(customer_id=self.customer_id)
+        self.assertEqual(test_cash.cash_value, Money(2, customsettings.CURRENCY))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_debit_as_read_queries(self):
+        """A debit of an account as read takes one update to change the balance"""
+        test_cash = Cash.objects.get(customer_id=self.customer_id)
+        VoucherLink.objects.all().delete()
+        Cash.objects.filter(pk=test_cash.pk).update(voucher_value=0)
+        test_cash.voucher_value = Money(0, customsettings.CURRENCY)
+        for shard in range(ROLLUP_SHARDS):
+            DailyRollup.objects.create(day=localdate(), transaction_type='debit', shard=shard)
+        rebuild_counters()
+        # savepoint, conditional update, log entry, daily total, cash total and savepoint release
+        with self.assertNumQueries(6):
+            post_debit(self.customer_id, Money(1, customsettings.CURRENCY), test_cash)
+        test_cash = Cash.objects.get(customer_id=self.customer_id)
+        self.assertEqual(test_cash.cash_value, Money(1, customsettings.CURRENCY))
+
+    def test_debit_of_changed_account(self):
+        """A debit of an account changed since it was read uses its latest balance"""
+        test_cash = Cash.objects.get(customer_id=self.customer_id)
+        Cash.objects.filter(pk=test_cash.pk).update(voucher_value=Money(1, customsettings.CURRENCY))
+        post_debit(self.customer_id, Money(2, customsettings.CURRENCY), test_cash)
+        debit = Transaction.objects.get()
+        self.assertEqual(debit.voucher_value, Money(1, customsettings.CURRENCY))
+        self.assertEqual(debit.transaction_value, Money(1, customsettings.CURRENCY))
+        test_cash = Cash.objects.get(customer_id=self.customer_id)
+        self.assertEqual(test_cash.cash_value, Money(1, customsettings.CURRENCY))
+        self.assertEqual(test_cash.voucher_value, Money(0, customsettings.CURRENCY))
+
+    def test_debit_as_read_more_than_available(self):
+        """A debit of an account as read is rejected if it can't be covered"""
+        test_cash = Cash.objects.get(customer_id=self.customer_id)
+        with self.assertRaises(InsufficientFunds):
+            post_debit(self.customer_id, Money(8, customsettings.CURRENCY), test_cash)
+        self.assertFalse(Transaction.objects.exists())
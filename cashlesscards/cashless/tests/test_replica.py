@@ -0,0 +1,125 @@
+from unittest import mock
+from django.conf import settings
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from cashless.models import Customer
+from cashless.replica import ReplicaRouter, ReplicaStickinessMiddleware, ReplicaReadMixin
+from cashless.replica import reporting, pinned_to_primary, reads_from_replica, replica_in_use
+from cashless.replica import REPLICA, STICKY_COOKIE, STICKY_SECONDS
+
+
+class ReplicaRouterTest(TestCase):
+    """Tests the routing of reads to the replica"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        self.router = ReplicaRouter()
+        # test cases run inside a transaction, which keeps reads on the primary
+        patcher = mock.patch.object(connection, 'in_atomic_block', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_use_primary(self):
+        """Reads outside a reporting block are left to the default routing"""
+        self.assertIsNone(self.router.db_for_read(Customer))
+
+    def test_reporting_reads_use_replica(self):
+        """Reads inside a reporting block go to the replica"""
+        with reporting():
+            self.assertEqual(self.router.db_for_read(Customer), REPLICA)
+        self.assertIsNone(self.router.db_for_read(Customer))
+
+    def test_pinned_reads_use_primary(self):
+        """Reads pinned to the primary stay there in a reporting block"""
+        with reporting(), pinned_to_primary():
+            self.assertIsNone(self.router.db_for_read(Customer))
+
+    def test_transaction_reads_use_primary(self):
+        """Reads inside a transaction stay on the primary in a reporting block"""
+        with reporting(), mock.patch.object(connection, 'in_atomic_block', True):
+            self.assertIsNone(self.router.db_for_read(Customer))
+
+    def test_replica_not_configured(self):
+        """Reads stay on the primary if there's no replica"""
+        with reporting(), mock.patch.object(settings, 'DATABASES', {'default': {}}):
+            self.assertIsNone(self.router.db_for_read(Customer))
+
+    def test_writes_use_primary(self):
+        """Writes go to the primary, even in a reporting block"""
+        with reporting():
+            self.assertEqual(self.router.db_for_write(Customer), 'default')
+
+    def test_replica_not_migrated(self):
+        """Migrations aren't run on the replica"""
+        self.assertFalse(self.router.allow_migrate(REPLICA, 'cashless'))
+        self.assertIsNone(self.router.allow_migrate('default', 'cashless'))
+
+    def test_view_decorator(self):
+        """A decorated view function reads from the replica"""
+        view = reads_from_replica(lambda request: replica_in_use())
+        self.assertTrue(view(None))
+        self.assertFalse(replica_in_use())
+
+    def test_view_mixin(self):
+        """A class based view with the mixin reads from the replica"""
+        class BaseView:
+            """Stands in for a generic view"""
+            def dispatch(self, request):
+                """Report where reads would go"""
+                return replica_in_use()
+
+        class TestView(ReplicaReadMixin, BaseView):
+            """A view reading from the replica"""
+
+        self.assertTrue(TestView().dispatch(None))
+        self.assertFalse(replica_in_use())
+
+
+class ReplicaStickinessMiddlewareTest(TestCase):
+    """Tests the pinning of reads to the primary after a change"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        self.factory = RequestFactory()
+        self.pinned = None
+
+        def view(request):
+            """Note whether a reporting read would have used the replica"""
+            with reporting(), mock.patch.object(connection, 'in_atomic_block', False):
+                self.pinned = not replica_in_use()
+            return HttpResponse()
+        self.middleware = ReplicaStickinessMiddleware(view)
+
+    def test_get_not_pinned(self):
+        """A plain page view can read from the replica"""
+        response = self.middleware(self.factory.get('/'))
+        self.assertFalse(self.pinned)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_post_pinned(self):
+        """A post reads from the primary and pins the user's next requests"""
+        response = self.middleware(self.factory.post('/'))
+        self.assertTrue(self.pinned)
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], STICKY_SECONDS)
+
+    def test_get_after_post_pinned(self):
+        """A page viewed shortly after a post reads from the primary"""
+        request = self.factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.middleware(request)
+        self.assertTrue(self.pinned)
+
+
+class ReplicaQueryTest(TransactionTestCase):
+    """Tests that reporting queries run on the replica connection"""
+    databases = '__all__'
+
+    def test_reporting_query_on_replica(self):
+        """A query in a reporting block runs on the replica connection"""
+        Customer.objects.create(card_number=99, first_name='John', surname='Smith')
+        with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+            with reporting():
+                self.assertEqual(Customer.objects.count(), 1)
+            self.assertEqual(Customer.objects.count(), 1)
+        self.assertEqual(len(replica_queries), 1)
@@ -0,0 +1,147 @@
+import datetime
+from unittest import mock
+from django.db import IntegrityError, transaction
+from django.db.models import QuerySet, Sum
+from django.test import TestCase
+from django.utils.timezone import now, localdate
+from djmoney.money import Money
+
+from cashless import customsettings
+from cashless.models import Customer, Cash, Transaction, DailyRollup, CustomerDailyRollup
+from cashless.posting import post_credit, post_debit
+from cashless.rollups import rebuild_rollups, record_transactions
+
+
+class DailyRollupTest(TestCase):
+    """Tests the daily transaction totals"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        self.test_customer = Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+        Cash.objects.create(customer_id=self.test_customer.pk)
+
+    def totals(self):
+        """Returns the site-wide totals, summed over their shards, and the
+        customer totals as comparable tuples"""
+        overall = DailyRollup.objects.values('day', 'transaction_type').annotate(
+            cash=Sum('transaction_value'),
+            voucher=Sum('voucher_value'),
+            count=Sum('transaction_count'),
+        ).order_by().values_list('day', 'transaction_type', 'cash', 'voucher', 'count')
+        by_customer = CustomerDailyRollup.objects.values_list(
+            'day', 'transaction_type', 'customer_id',
+            'transaction_value', 'voucher_value', 'transaction_count',
+        )
+        return sorted(overall, key=str), sorted(by_customer, key=str)
+
+    def day_total(self, transaction_type):
+        """Returns today's site-wide totals for a type, summed over their shards"""
+        return DailyRollup.objects.filter(
+            day=localdate(),
+            transaction_type=transaction_type,
+        ).aggregate(cash=Sum('transaction_value'), count=Sum('transaction_count'))
+
+    def test_posting_adds_to_totals(self):
+        """Posted credits and debits add to today's totals by type"""
+        post_credit(self.test_customer.pk, Money(5, customsettings.CURRENCY))
+        post_credit(self.test_customer.pk, Money(3, customsettings.CURRENCY))
+        post_debit(self.test_customer.pk, Money(2, customsettings.CURRENCY))
+        self.assertEqual(
+            self.day_total('credit'),
+            {'cash': Money(8, customsettings.CURRENCY), 'count': 2}
+        )
+        self.assertEqual(
+            self.day_total('debit'),
+            {'cash': Money(2, customsettings.CURRENCY), 'count': 1}
+        )
+        self.assertFalse(CustomerDailyRollup.objects.exists())
+
+    def test_postings_spread_over_shards(self):
+        """Postings add to the shard picked for them"""
+        for shard in (3, 5):
+            with mock.patch('cashless.rollups.randrange', return_value=shard):
+                post_credit(self.test_customer.pk, Money(1, customsettings.CURRENCY))
+        self.assertEqual(
+            sorted(DailyRollup.objects.values_list('shard', 'transaction_count')),
+            [(3, 1), (5, 1)]
+        )
+
+    def test_shard_is_unique(self):
+        """Only one row can hold a day's total for a type in each shard"""
+        DailyRollup.objects.create(day=localdate(), transaction_type='credit', shard=0)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                DailyRollup.objects.create(day=localdate(), transaction_type='credit', shard=0)
+
+    def test_concurrent_create(self):
+        """A till that finds no row but loses the race to create it adds to the winner's row"""
+        update = QuerySet.update
+        missed = []
+
+        def update_after_miss(queryset, **kwargs):
+            """Miss each table's row the first time, as if another till hadn't committed it yet"""
+            if queryset.model not in missed:
+                missed.append(queryset.model)
+                return 0
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(customsettings, 'ROLLUP_BY_CUSTOMER', True), \
+                mock.patch('cashless.rollups.randrange', return_value=0):
+            post_credit(self.test_customer.pk, Money(5, customsettings.CURRENCY))
+            credit = Transaction.objects.create(
+                customer_id=self.test_customer.pk,
+                transaction_value=Money(3, customsettings.CURRENCY),
+            )
+            with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=update_after_miss):
+                record_transactions([credit])
+        self.assertEqual(missed, [DailyRollup, CustomerDailyRollup])
+        rollup = DailyRollup.objects.get()
+        self.assertEqual(rollup.transaction_value, Money(8, customsettings.CURRENCY))
+        self.assertEqual(rollup.transaction_count, 2)
+        self.assertEqual(CustomerDailyRollup.objects.get().transaction_count, 2)
+
+    def test_by_customer(self):
+        """Per customer totals are kept alongside the overall totals when enabled"""
+        with mock.patch.object(customsettings, 'ROLLUP_BY_CUSTOMER', True):
+            post_credit(self.test_customer.pk, Money(5, customsettings.CURRENCY))
+        self.assertEqual(DailyRollup.objects.count(), 1)
+        rollup = CustomerDailyRollup.objects.get(customer_id=self.test_customer.pk)
+        self.assertEqual(rollup.transaction_value, Money(5, customsettings.CURRENCY))
+
+    def test_rebuild_matches_incremental(self):
+        """Rebuilding from the log gives the same totals as posting"""
+        post_credit(self.test_customer.pk, Money(5, customsettings.CURRENCY))
+        post_debit(self.test_customer.pk, Money(2, customsettings.CURRENCY))
+        old = Transaction.objects.create(
+            customer_id=self.test_customer.pk,
+            transaction_time=now() - datetime.timedelta(days=40),
+            transaction_value=Money(4, customsettings.CURRENCY),
+        )
+        record_transactions([old])
+        incremental = self.totals()
+        DailyRollup.objects.all().delete()
+        self.assertEqual(rebuild_rollups(), 3)
+        self.assertEqual(self.totals(), incremental)
+
+    def test_rebuild_by_customer(self):
+        """Rebuilding writes the per customer totals to their own table"""
+        with mock.patch.object(customsettings, 'ROLLUP_BY_CUSTOMER', True):
+            post_credit(self.test_customer.pk, Money(5, customsettings.CURRENCY))
+            incremental = self.totals()
+            self.assertEqual(rebuild_rollups(), 2)
+        self.assertEqual(self.totals(), incremental)
+
+    def test_rebuild_range(self):
+        """Rebuilding a range of days leaves the other days alone"""
+        post_credit(self.test_customer.pk, Money(5, customsettings.CURRENCY))
+        Transaction.objects.create(
+            customer_id=self.test_customer.pk,
+            transaction_time=now() - datetime.timedelta(days=40),
+            transaction_value=Money(4, customsettings.CURRENCY),
+        )
+        yesterday = localdate() - datetime.timedelta(days=1)
+        self.assertEqual(rebuild_rollups(end=yesterday), 1)
+        self.assertEqual(DailyRollup.objects.count(), 2)
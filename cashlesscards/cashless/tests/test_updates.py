@@ -0,0 +1,75 @@
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils.timezone import now
+
+from cashless import customsettings
+from cashless.updates import refresh_version_check, cached_version_check, VERSION_CACHE_KEY
+from cashless.updates import VERSION_CHECK_TIMEOUT, VERSION_CHECK_TTL
+
+
+def github_file(version):
+    """Returns a fake response holding a customsettings file with the version"""
+    return BytesIO(b"# current version of the system\nVERSION = " + str(version).encode() + b"\n")
+
+
+class UpdateCheckTest(TestCase):
+    """Tests the cached update check"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        cache.delete(VERSION_CACHE_KEY)
+
+    def test_refresh_caches_result(self):
+        """A refresh asks github with a timeout and caches the result"""
+        with mock.patch('cashless.updates.urllib.request.urlopen', return_value=github_file(99.0)) as urlopen:
+            self.assertEqual(refresh_version_check(), (False, 99.0))
+        self.assertEqual(urlopen.call_args[1]['timeout'], VERSION_CHECK_TIMEOUT)
+        with mock.patch('cashless.updates.urllib.request.urlopen') as urlopen:
+            result, checked = cached_version_check()
+        urlopen.assert_not_called()
+        self.assertEqual(result, (False, 99.0))
+        self.assertIsNotNone(checked)
+
+    def test_current_version(self):
+        """The installed version matches when github has the same one"""
+        with mock.patch(
+                'cashless.updates.urllib.request.urlopen',
+                return_value=github_file(customsettings.VERSION)):
+            self.assertEqual(refresh_version_check(), (True, customsettings.VERSION))
+
+    def test_refresh_offline(self):
+        """A failed refresh caches that github couldn't be reached"""
+        with mock.patch('cashless.updates.urllib.request.urlopen', side_effect=OSError):
+            self.assertIsNone(refresh_version_check())
+        result, checked = cached_version_check()
+        self.assertIsNone(result)
+        self.assertIsNotNone(checked)
+
+    def test_missing_result_refreshes_in_background(self):
+        """With nothing cached, the check returns straight away and refreshes in a thread"""
+        with mock.patch('cashless.updates.threading.Thread') as thread:
+            self.assertEqual(cached_version_check(), (None, None))
+        thread.return_value.start.assert_called_once_with()
+
+        # run what the thread would have
+        with mock.patch('cashless.updates.urllib.request.urlopen', return_value=github_file(99.0)):
+            thread.call_args[1]['target']()
+        self.assertEqual(cached_version_check()[0], (False, 99.0))
+
+    def test_stale_result_still_shown(self):
+        """An out of date result is returned while a thread refreshes it"""
+        checked = now() - timedelta(seconds=VERSION_CHECK_TTL + 1)
+        cache.set(VERSION_CACHE_KEY, {'result': (True, 1.0), 'checked': checked}, None)
+        with mock.patch('cashless.updates.threading.Thread') as thread:
+            self.assertEqual(cached_version_check(), ((True, 1.0), checked))
+        thread.return_value.start.assert_called_once_with()
+
+    def test_fresh_result_not_refreshed(self):
+        """A recent result is returned without starting a refresh"""
+        with mock.patch('cashless.updates.urllib.request.urlopen', return_value=github_file(99.0)):
+            refresh_version_check()
+        with mock.patch('cashless.updates.threading.Thread') as thread:
+            self.assertEqual(cached_version_check()[0], (False, 99.0))
+        thread.assert_not_called()
@@ -1,11 +1,19 @@
+import datetime
+from unittest import mock
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User, Permission
-from django.utils.timezone import now
+from django.core.cache import cache
+from django.utils.timezone import now, localdate, localtime
 from djmoney.money import Money
 
 from cashless import customsettings
-from cashless.models import Voucher, Customer, Cash, Transaction
+from cashless.models import Voucher, Customer, Cash, Transaction, VoucherLink, DailyRollup
+from cashless.views import ActivityLog, CustomerListView
+from cashless.updates import VERSION_CACHE_KEY
+from cashless.posting import post_debit
 
 
 class IndexViewTest(TestCase):
@@ -49,6 +57,7 @@ class InfoViewTest(TestCase):
         test_voucher.save()
         test_customer.save()
         test_cash.save()
+        cache.delete(VERSION_CACHE_KEY)
 
     def test_view_url_exists_at_desired_location(self):
         """The URL exists in the expected location"""
@@ -66,6 +75,23 @@ class InfoViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'cashless/info.html')
 
+    def test_no_network_in_request(self):
+        """The page reads the cached update check rather than contacting github"""
+        with mock.patch('cashless.updates.urllib.request.urlopen') as urlopen:
+            with mock.patch('cashless.updates.start_background_refresh') as refresh:
+                response = self.client.get(reverse('info'))
+        self.assertEqual(response.status_code, 200)
+        urlopen.assert_not_called()
+        refresh.assert_called_once_with()
+
+    def test_cached_update_check(self):
+        """A cached newer version is shown to superusers"""
+        User.objects.create_superuser('admin', 'admin@localhost', '1X<ISRUkw+tuK')
+        self.client.login(username='admin', password='1X<ISRUkw+tuK')
+        cache.set(VERSION_CACHE_KEY, {'result': (False, 9.9), 'checked': now()})
+        response = self.client.get(reverse('info'))
+        self.assertContains(response, "Version 9.9 is available.")
+
 
 class SearchViewTest(TestCase):
     """Tests the search view"""
@@ -173,6 +199,209 @@ class ActivityLogViewTest(TestCase):
         self.assertTrue('transaction_log' in response.context)
 
 
+class ActivityLogFilterTest(TestCase):
+    """Tests filtering the activity log by date"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        test_user = User.objects.create_user(
+            username='testuser1',
+            password='1X<ISRUkw+tuK',
+        )
+        permission = Permission.objects.get(name='Can view transaction log')
+        test_user.user_permissions.add(permission)
+        test_customer = Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+
+        # log a transaction now and another in the same month last year
+        self.today = localdate()
+        self.last_year = now() - datetime.timedelta(days=366)
+        for transaction_time in (now(), self.last_year):
+            Transaction.objects.create(
+                customer_id=test_customer.pk,
+                transaction_time=transaction_time,
+                transaction_value=Money(2, customsettings.CURRENCY),
+            )
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def test_defaults_to_this_month(self):
+        """Without a range only this month's transactions are shown"""
+        response = self.client.get(reverse('activity_log'))
+        self.assertEqual(len(response.context['transaction_log']), 1)
+
+    def test_date_range(self):
+        """Transactions are shown between the chosen dates inclusive"""
+        day = localtime(self.last_year).date()
+        response = self.client.get(reverse('activity_log'), {
+            'start': day.isoformat(),
+            'end': day.isoformat(),
+        })
+        self.assertEqual(len(response.context['transaction_log']), 1)
+        self.assertEqual(response.context['filter_query'], 'start=' + day.isoformat() + '&end=' + day.isoformat())
+
+        response = self.client.get(reverse('activity_log'), {
+            'start': day.isoformat(),
+            'end': self.today.isoformat(),
+        })
+        self.assertEqual(len(response.context['transaction_log']), 2)
+
+    def test_invalid_range(self):
+        """A back to front range is reported and the default range is used"""
+        response = self.client.get(reverse('activity_log'), {
+            'start': self.today.isoformat(),
+            'end': (self.today - datetime.timedelta(days=1)).isoformat(),
+        })
+        self.assertFalse(response.context['filter_form'].is_valid())
+        self.assertEqual(len(response.context['transaction_log']), 1)
+
+
+class ActivityLogToCsvTest(TestCase):
+    """Tests the activity log CSV download"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        test_user = User.objects.create_user(
+            username='testuser1',
+            password='1X<ISRUkw+tuK',
+        )
+        permission = Permission.objects.get(name='Can view transaction log')
+        test_user.user_permissions.add(permission)
+        test_customer = Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+
+        # log more transactions than fit on one page of the log
+        Transaction.objects.bulk_create([
+            Transaction(
+                customer_id=test_customer.pk,
+                transaction_time=now(),
+                transaction_value=Money(2, customsettings.CURRENCY),
+            )
+            for i in range(15)
+        ])
+        Transaction.objects.create(
+            customer_id=test_customer.pk,
+            transaction_time=now() - datetime.timedelta(days=366),
+            transaction_value=Money(3, customsettings.CURRENCY),
+        )
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def test_streams_whole_period(self):
+        """The download holds every transaction in the period rather than one page"""
+        response = self.client.get(reverse('activity_log_csv'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Customer surname,Customer first name,Time,Type,Cash value,Voucher value')
+        self.assertEqual(len(lines), 16)
+        self.assertTrue(lines[1].startswith('Smith,John,'))
+        self.assertTrue(lines[1].endswith(',credit,2.00,0.00'))
+
+    def test_date_range(self):
+        """The download only holds transactions in the chosen range"""
+        start = localdate() - datetime.timedelta(days=400)
+        end = localdate() - datetime.timedelta(days=300)
+        response = self.client.get(reverse('activity_log_csv'), {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+        })
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].endswith(',credit,3.00,0.00'))
+
+
+class ListQueryCountTest(TestCase):
+    """Tests the list pages use a fixed number of queries whatever their length"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        test_user = User.objects.create_user(
+            username='testuser1',
+            password='1X<ISRUkw+tuK',
+        )
+        for name in ('Create and edit customer accounts', 'Can view transaction log'):
+            test_user.user_permissions.add(Permission.objects.get(name=name))
+        for i in range(10):
+            test_customer = Customer.objects.create(
+                card_number=i,
+                first_name='John',
+                surname='Smith',
+            )
+            Cash.objects.create(customer_id=test_customer.pk)
+            Transaction.objects.create(
+                customer_id=test_customer.pk,
+                transaction_time=now(),
+                transaction_value=Money(2, customsettings.CURRENCY),
+            )
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def count_queries(self, view, url, page_size):
+        """Returns the number of queries used to render a page of the given size"""
+        with mock.patch.object(view, 'paginate_by', page_size):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+        self.assertEqual(len(response.context['object_list']), page_size)
+        return len(queries.captured_queries)
+
+    def test_activity_log(self):
+        """The log reads its customers' names in the same query"""
+        self.assertEqual(
+            self.count_queries(ActivityLog, reverse('activity_log'), 2),
+            self.count_queries(ActivityLog, reverse('activity_log'), 10),
+        )
+
+    def test_customer_list(self):
+        """The customer list reads the customers' balances in the same query"""
+        self.assertEqual(
+            self.count_queries(CustomerListView, reverse('customer_list'), 2),
+            self.count_queries(CustomerListView, reverse('customer_list'), 10),
+        )
+
+
+class SummaryReportViewTest(TestCase):
+    """Tests the summary report view"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        test_user = User.objects.create_user(
+            username='testuser1',
+            password='1X<ISRUkw+tuK',
+        )
+        permission = Permission.objects.get(name='Can view transaction log')
+        test_user.user_permissions.add(permission)
+        for day in (datetime.date(2019, 1, 1), datetime.date(2019, 1, 2), datetime.date(2018, 12, 1)):
+            DailyRollup.objects.create(
+                day=day,
+                transaction_type='credit',
+                transaction_value=Money(2, customsettings.CURRENCY),
+                transaction_count=3,
+            )
+
+    def test_redirect_if_not_logged_in(self):
+        """The view will redirect to a login page if the user is not logged in"""
+        response = self.client.get(reverse('summary_report'))
+        self.assertRedirects(response, '/accounts/login/?next=/cashless/log/summary')
+
+    def test_monthly_totals(self):
+        """The daily totals are summed by month"""
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('summary_report'))
+        self.assertTemplateUsed(response, 'cashless/summary_report.html')
+        summary = response.context['summary']
+        self.assertEqual(len(summary), 2)
+        self.assertEqual(summary[0]['transaction_value'], Money(4, customsettings.CURRENCY))
+        self.assertEqual(summary[0]['transaction_count'], 6)
+
+    def test_yearly_totals(self):
+        """The daily totals are summed by year"""
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('summary_report'), {'period': 'year'})
+        summary = response.context['summary']
+        self.assertEqual([row['period'].year for row in summary], [2019, 2018])
+
+
 class CustomerPaymentTest(TestCase):
     """Tests the stripe card payment view"""
 
@@ -200,6 +429,25 @@ class CustomerPaymentTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'cashless/customer_payment.html')
 
+    def test_balance_after_payment(self):
+        """The balance shown after a payment includes a debit made while it was taken"""
+        def charge(**kwargs):
+            """Debit the account while the card is charged"""
+            post_debit(1, Money(1, customsettings.CURRENCY))
+            return {'status': 'succeeded'}
+
+        with mock.patch('cashless.views.stripe.Charge.create', side_effect=charge):
+            response = self.client.post(
+                reverse('customer_payment', kwargs={'pk': 1}),
+                {
+                    'cash_to_add_0': '10.00',
+                    'cash_to_add_1': customsettings.CURRENCY,
+                    'stripeToken': 'tok_visa',
+                }
+            )
+        self.assertTemplateUsed(response, 'cashless/customer_charged.html')
+        self.assertEqual(response.context['total'], Money(16, customsettings.CURRENCY))
+
 
 class AddCashCashierViewTest(TestCase):
     """Tests the add cash cashier view"""
@@ -352,6 +600,32 @@ class DeductCashCashierViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'cashless/cash_transactions.html')
 
+    def test_deduct_more_than_available(self):
+        """Deducting more than the customer has shows a message and changes nothing"""
+        test_customer = Customer.objects.get(id=1)
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('deduct_cash_cashier', \
+            kwargs={'pk': test_customer.pk}), {
+                'cash_to_deduct_0': '8.00',
+                'cash_to_deduct_1': customsettings.CURRENCY,
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['too_much'])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_deduct_redirects_to_customer(self):
+        """A successful debit redirects to the customer's account"""
+        test_customer = Customer.objects.get(id=1)
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('deduct_cash_cashier', \
+            kwargs={'pk': test_customer.pk}), {
+                'cash_to_deduct_0': '6.00',
+                'cash_to_deduct_1': customsettings.CURRENCY,
+            })
+        self.assertRedirects(response, reverse('customer_detail', kwargs={'pk': test_customer.pk}))
+        test_cash = Cash.objects.get(customer_id=test_customer.pk)
+        self.assertEqual(test_cash.cash_value, Money(1, customsettings.CURRENCY))
+
 
 class AddVoucherLinkViewTest(TestCase):
     """Tests the add voucher link view"""
@@ -398,6 +672,67 @@ class AddVoucherLinkViewTest(TestCase):
             + str(test_customer.pk) + '/assignvoucher/')
 
 
+    def test_assign_voucher(self):
+        """A voucher is assigned to the customer"""
+        test_customer = Customer.objects.get(card_number=99)
+        test_voucher = Voucher.objects.create(
+            voucher_application='daily',
+            voucher_name='test',
+            voucher_value=Money(5, customsettings.CURRENCY),
+        )
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('add_voucher_link', \
+            kwargs={'pk': test_customer.pk}), {'voucher': test_voucher.pk})
+        self.assertRedirects(
+            response,
+            reverse('customer_detail', kwargs={'pk': test_customer.pk}),
+            fetch_redirect_response=False
+        )
+        self.assertTrue(VoucherLink.objects.filter(
+            customer_id=test_customer.pk, voucher_id=test_voucher.pk
+        ).exists())
+
+    def test_voucher_already_assigned(self):
+        """A voucher the customer already has is reported on the form"""
+        test_customer = Customer.objects.get(card_number=99)
+        test_voucher = Voucher.objects.create(
+            voucher_application='daily',
+            voucher_name='test',
+            voucher_value=Money(5, customsettings.CURRENCY),
+        )
+        VoucherLink.objects.create(customer_id=test_customer.pk, voucher_id=test_voucher.pk)
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('add_voucher_link', \
+            kwargs={'pk': test_customer.pk}), {'voucher': test_voucher.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response, 'form', 'voucher',
+            'Invalid value - voucher already assigned to customer'
+        )
+
+    def test_voucher_assigned_while_assigning(self):
+        """A voucher assigned after the form was checked is reported on the form"""
+        test_customer = Customer.objects.get(card_number=99)
+        test_voucher = Voucher.objects.create(
+            voucher_application='daily',
+            voucher_name='test',
+            voucher_value=Money(5, customsettings.CURRENCY),
+        )
+        VoucherLink.objects.create(customer_id=test_customer.pk, voucher_id=test_voucher.pk)
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        with mock.patch.object(
+                VoucherLink.objects, 'filter', return_value=VoucherLink.objects.none()
+        ):
+            response = self.client.post(reverse('add_voucher_link', \
+                kwargs={'pk': test_customer.pk}), {'voucher': test_voucher.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response, 'form', 'voucher',
+            'Invalid value - voucher already assigned to customer'
+        )
+        self.assertEqual(VoucherLink.objects.count(), 1)
+
+
 class CreateNewVoucherViewTest(TestCase):
     """Tests the create new voucher view"""
     def setUp(self):
@@ -429,6 +764,103 @@ class CreateNewVoucherViewTest(TestCase):
         self.assertRedirects(response, '/accounts/login/?next=/cashless/voucher/new')
 
 
+    def test_create_voucher(self):
+        """A new voucher is created"""
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('create_new_voucher'), {
+            'application': 'daily',
+            'name': 'test',
+            'value_0': 5,
+            'value_1': customsettings.CURRENCY,
+        })
+        test_voucher = Voucher.objects.get(voucher_name='test')
+        self.assertRedirects(response, reverse('voucher_detail', kwargs={'pk': test_voucher.pk}))
+
+    def test_name_taken_while_creating(self):
+        """A name used by another voucher after the form was checked is reported on the form"""
+        Voucher.objects.create(
+            voucher_application='daily',
+            voucher_name='test',
+            voucher_value=Money(5, customsettings.CURRENCY),
+        )
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        with mock.patch.object(Voucher.objects, 'filter', return_value=Voucher.objects.none()):
+            response = self.client.post(reverse('create_new_voucher'), {
+                'application': 'daily',
+                'name': 'test',
+                'value_0': 5,
+                'value_1': customsettings.CURRENCY,
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response, 'form', 'name', 'Invalid value - voucher already exists')
+        self.assertEqual(Voucher.objects.count(), 1)
+
+
+class VoucherUpdateViewTest(TestCase):
+    """Tests the voucher update view"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        # Create a user
+        test_user1 = User.objects.create_user(
+            username='testuser1',
+            password='1X<ISRUkw+tuK',
+        )
+        # Add permisssions
+        permission = Permission.objects.get(name='Create and edit vouchers')
+        test_user1.user_permissions.add(permission)
+        test_user1.save()
+
+        # Create a customer holding a voucher
+        test_voucher = Voucher.objects.create(
+            voucher_application="daily",
+            voucher_name="free breakfast",
+            voucher_value=Money(2, customsettings.CURRENCY),
+        )
+        test_customer = Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+        Cash.objects.create(
+            customer_id=test_customer.pk,
+            voucher_value=Money(2, customsettings.CURRENCY),
+        )
+        VoucherLink.objects.create(
+            customer_id=test_customer.pk,
+            voucher_id=test_voucher.pk,
+            voucher_value=Money(2, customsettings.CURRENCY),
+        )
+
+    def post_update(self, propagate):
+        """Submit a new value for the test voucher"""
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        test_voucher = Voucher.objects.get(voucher_name="free breakfast")
+        data = {
+            'voucher_application': 'daily',
+            'voucher_name': 'free breakfast',
+            'voucher_value_0': '3.00',
+            'voucher_value_1': customsettings.CURRENCY,
+        }
+        if propagate:
+            data['propagate'] = 'on'
+        return self.client.post(
+            reverse('update_voucher', kwargs={'pk': test_voucher.pk}), data, follow=True
+        )
+
+    def test_update_without_propagating(self):
+        """Customers' balances are left alone unless propagation is requested"""
+        self.post_update(propagate=False)
+        test_cash = Cash.objects.get(customer__card_number=99)
+        self.assertEqual(test_cash.voucher_value, Money(2, customsettings.CURRENCY))
+
+    def test_update_with_propagating(self):
+        """Propagating a new value updates customers' balances and reports it"""
+        response = self.post_update(propagate=True)
+        test_cash = Cash.objects.get(customer__card_number=99)
+        self.assertEqual(test_cash.voucher_value, Money(3, customsettings.CURRENCY))
+        self.assertContains(response, "Updated 1 assigned vouchers across 1 customer accounts.")
+
+
 class CreateNewCustomerViewTest(TestCase):
     """Tests the create new customer view"""
     def setUp(self):
@@ -458,3 +890,36 @@ class CreateNewCustomerViewTest(TestCase):
         self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
         response = self.client.get(reverse('create_new_customer'))
         self.assertRedirects(response, '/accounts/login/?next=/cashless/customer/new')
+
+    def test_create_customer(self):
+        """A new customer is created with a cash account"""
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('create_new_customer'), {
+            'first_name': 'John',
+            'surname': 'Smith',
+            'card_number': 99,
+            'opening_balance_0': 2,
+            'opening_balance_1': customsettings.CURRENCY,
+        })
+        test_customer = Customer.objects.get(card_number=99)
+        self.assertRedirects(response, reverse('customer_detail', kwargs={'pk':test_customer.pk}))
+        self.assertEqual(test_customer.cash.cash_value, Money(2, customsettings.CURRENCY))
+
+    def test_card_taken_while_creating(self):
+        """A card registered after the form was checked is reported on the form"""
+        Customer.objects.create(card_number=99, first_name='Jane', surname='Smith')
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        with mock.patch.object(Customer.objects, 'filter', return_value=Customer.objects.none()):
+            response = self.client.post(reverse('create_new_customer'), {
+                'first_name': 'John',
+                'surname': 'Smith',
+                'card_number': 99,
+                'opening_balance_0': 2,
+                'opening_balance_1': customsettings.CURRENCY,
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response, 'form', 'card_number',
+            'Invalid value - a card with this number already exists on the system'
+        )
+        self.assertEqual(Customer.objects.count(), 1)
@@ -1,10 +1,19 @@
 from datetime import timedelta, date
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils.timezone import localdate
 from djmoney.money import Money
 
 from cashless import customsettings
-from cashless.models import Voucher, Customer, Cash, VoucherLink
+from cashless.cache import make_key, VOUCHERS
+from cashless.models import Voucher, Customer, Cash, VoucherLink, Transaction, DailyRollup
 from cashless.voucherhandler import apply_voucher, debit_voucher, distribute_voucher_debit
+from cashless.voucherhandler import plan_voucher_debit
+from cashless.voucherhandler import reset_due_vouchers, propagate_voucher_value
+from cashless.voucherhandler import NO_VOUCHER_RESET, voucher_definitions
+from cashless.counters import rebuild_counters
+from cashless.rollups import ROLLUP_SHARDS
+from cashless.posting import post_credit
 
 
 class ApplyVoucherHandlerTest(TestCase):
@@ -94,12 +103,131 @@ class ApplyVoucherHandlerTest(TestCase):
         self.assertEqual(test_link.last_applied, date.today())
         self.assertEqual(test_customer.cash.voucher_value, expected_result)
 
+    def test_next_reset_is_stored(self):
+        """Applying vouchers records when the customer's next voucher is due"""
+        test_customer = Customer.objects.get(pk=1)
+        apply_voucher(test_customer)
+        test_cash = Cash.objects.get(customer_id=test_customer.pk)
+        self.assertEqual(test_cash.next_voucher_reset, date.today()+timedelta(days=1))
+
+    def test_no_voucher_next_reset(self):
+        """A customer without vouchers is never due a reset"""
+        test_customer = Customer.objects.get(pk=2)
+        apply_voucher(test_customer)
+        test_cash = Cash.objects.get(customer_id=test_customer.pk)
+        self.assertEqual(test_cash.next_voucher_reset, NO_VOUCHER_RESET)
+
+    def test_not_due_skips_queries(self):
+        """A customer with no voucher due is checked without querying the database"""
+        Cash.objects.filter(customer_id=1).update(
+            next_voucher_reset=date.today()+timedelta(days=1)
+        )
+        test_customer = Customer.objects.select_related('cash').get(pk=1)
+        with self.assertNumQueries(0):
+            apply_voucher(test_customer)
+        self.assertEqual(test_customer.cash.voucher_value, Money(5, customsettings.CURRENCY))
+
+    def test_voucher_missing_from_cache(self):
+        """A linked voucher left out of this process's cached details is still counted"""
+        voucher_definitions()
+        test_voucher = Voucher.objects.create(
+            voucher_application="weekly",
+            voucher_name="weekend treat",
+            voucher_value=Money(2, customsettings.CURRENCY),
+        )
+        VoucherLink.objects.create(
+            customer_id=1,
+            voucher_id=test_voucher.pk,
+            last_applied=date.today(),
+            voucher_value=Money(2, customsettings.CURRENCY),
+        )
+        # as if the voucher was added through another process's cache
+        cache.set(make_key(VOUCHERS, 'definitions'), {1: ("daily", Money(5, customsettings.CURRENCY))})
+        test_customer = Customer.objects.get(pk=1)
+        apply_voucher(test_customer)
+        test_cash = Cash.objects.get(customer_id=test_customer.pk)
+        self.assertEqual(test_cash.voucher_value, Money(7, customsettings.CURRENCY))
+        self.assertIn(test_voucher.pk, voucher_definitions())
+
+    def test_keeps_concurrent_credit(self):
+        """A credit posted after the customer was loaded isn't overwritten"""
+        test_customer = Customer.objects.select_related('cash').get(pk=1)
+        post_credit(test_customer.pk, Money(3, customsettings.CURRENCY))
+        apply_voucher(test_customer)
+        test_cash = Cash.objects.get(customer_id=test_customer.pk)
+        self.assertEqual(test_cash.cash_value, Money(5, customsettings.CURRENCY))
+        self.assertEqual(test_cash.voucher_value, Money(5, customsettings.CURRENCY))
+
+
+class ApplyVoucherQueryCountTest(TestCase):
+    """Tests the apply voucher function makes a fixed number of queries"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        for card in (99, 98):
+            test_customer = Customer.objects.create(
+                card_number=card,
+                first_name='John',
+                surname='Smith',
+            )
+            Cash.objects.create(
+                customer_id=test_customer.pk,
+                cash_value=Money(2, customsettings.CURRENCY),
+            )
+        # one voucher for the first customer and five for the second
+        for i in range(5):
+            test_voucher = Voucher.objects.create(
+                voucher_application="daily",
+                voucher_name="voucher " + str(i),
+                voucher_value=Money(1, customsettings.CURRENCY),
+            )
+            for test_customer in Customer.objects.all():
+                if i == 0 or test_customer.card_number == 98:
+                    VoucherLink.objects.create(
+                        customer_id=test_customer.pk,
+                        voucher_id=test_voucher.pk,
+                        last_applied=date.today()-timedelta(days=1),
+                    )
+        # today's totals already exist in every shard, as they will after the first few transactions
+        for shard in range(ROLLUP_SHARDS):
+            DailyRollup.objects.create(day=localdate(), transaction_type='credit', shard=shard)
+        rebuild_counters()
+        voucher_definitions()
+
+    def test_one_voucher_queries(self):
+        """Resetting a single voucher takes a fixed number of queries"""
+        test_customer = Customer.objects.select_related('cash').get(card_number=99)
+        # one more on SQLite, to take the write lock before reading
+        with self.assertNumQueries(10):
+            apply_voucher(test_customer)
+        self.assertEqual(test_customer.cash.voucher_value, Money(1, customsettings.CURRENCY))
+
+    def test_many_vouchers_queries(self):
+        """Resetting several vouchers takes the same number of queries as one"""
+        test_customer = Customer.objects.select_related('cash').get(card_number=98)
+        # one more on SQLite, to take the write lock before reading
+        with self.assertNumQueries(10):
+            apply_voucher(test_customer)
+        self.assertEqual(test_customer.cash.voucher_value, Money(5, customsettings.CURRENCY))
+        self.assertEqual(
+            VoucherLink.objects.filter(customer_id=test_customer.pk, last_applied=date.today()).count(),
+            5
+        )
 
 
 class DebitVoucherTest(TestCase):
     """Tests the debit voucher function"""
     def setUp(self):
         """Set up non-modified objects used by all test methods"""
+        Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+        Voucher.objects.create(
+            voucher_application="daily",
+            voucher_name="free breakfast",
+            voucher_value=Money(5, customsettings.CURRENCY),
+        )
         test_cash1 = Cash.objects.create(
             customer_id=1,
             cash_value=Money(2, customsettings.CURRENCY),
@@ -170,6 +298,17 @@ class DistributeVoucherDebitTest(TestCase):
     """Tests the distribute voucher debit function"""
     def setUp(self):
         """Set up non-modified objects used by all test methods"""
+        Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+        for name in ("free breakfast", "free lunch"):
+            Voucher.objects.create(
+                voucher_application="daily",
+                voucher_name=name,
+                voucher_value=Money(5, customsettings.CURRENCY),
+            )
         test_cash = Cash.objects.create(
             customer_id=1,
             cash_value=Money(2, customsettings.CURRENCY),
@@ -237,3 +376,186 @@ class DistributeVoucherDebitTest(TestCase):
         # test output
         self.assertEqual(test_link1.voucher_value, expected_link_value1)
         self.assertEqual(test_link2.voucher_value, expected_link_value2)
+
+
+class ResetDueVouchersTest(TestCase):
+    """Tests the bulk voucher reset"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        daily = Voucher.objects.create(
+            voucher_application="daily",
+            voucher_name="free breakfast",
+            voucher_value=Money(5, customsettings.CURRENCY),
+        )
+        yearly = Voucher.objects.create(
+            voucher_application="yearly",
+            voucher_name="birthday treat",
+            voucher_value=Money(10, customsettings.CURRENCY),
+        )
+        for card, last_applied in ((99, date.today()-timedelta(days=1)), (98, date.today())):
+            customer = Customer.objects.create(
+                card_number=card,
+                first_name='John',
+                surname='Smith',
+            )
+            Cash.objects.create(
+                customer_id=customer.pk,
+                cash_value=Money(2, customsettings.CURRENCY),
+                voucher_value=Money(3, customsettings.CURRENCY),
+            )
+            VoucherLink.objects.create(
+                customer_id=customer.pk,
+                voucher_id=daily.pk,
+                last_applied=last_applied,
+                voucher_value=Money(3, customsettings.CURRENCY),
+            )
+            VoucherLink.objects.create(
+                customer_id=customer.pk,
+                voucher_id=yearly.pk,
+                last_applied=date.today(),
+                voucher_value=Money(0, customsettings.CURRENCY),
+            )
+
+    def test_due_customer_is_reset(self):
+        """A customer whose voucher is due has their voucher balance reset"""
+        credited = reset_due_vouchers()
+        cash = Cash.objects.get(customer__card_number=99)
+        link = VoucherLink.objects.get(customer__card_number=99, voucher__voucher_name="free breakfast")
+        self.assertEqual(credited, 1)
+        self.assertEqual(cash.voucher_value, Money(5, customsettings.CURRENCY))
+        self.assertEqual(link.last_applied, date.today())
+
+    def test_not_due_customer_is_unchanged(self):
+        """A customer whose vouchers aren't due keeps their voucher balance"""
+        reset_due_vouchers()
+        cash = Cash.objects.get(customer__card_number=98)
+        self.assertEqual(cash.voucher_value, Money(3, customsettings.CURRENCY))
+
+    def test_reset_is_logged(self):
+        """The bulk reset logs the credited difference in the transaction log"""
+        reset_due_vouchers(batch_size=1)
+        transact = Transaction.objects.get()
+        self.assertEqual(transact.customer.card_number, 99)
+        self.assertEqual(transact.voucher_value, Money(2, customsettings.CURRENCY))
+
+    def test_voucher_missing_from_cache(self):
+        """Due links are reset even if their voucher is missing from the cached details"""
+        cache.set(make_key(VOUCHERS, 'definitions'), {})
+        self.assertEqual(reset_due_vouchers(), 1)
+        cash = Cash.objects.get(customer__card_number=99)
+        link = VoucherLink.objects.get(customer__card_number=99, voucher__voucher_name="free breakfast")
+        self.assertEqual(cash.voucher_value, Money(5, customsettings.CURRENCY))
+        self.assertEqual(link.last_applied, date.today())
+
+    def test_next_reset_is_stored(self):
+        """The bulk reset records when each credited customer is next due"""
+        reset_due_vouchers()
+        cash = Cash.objects.get(customer__card_number=99)
+        self.assertEqual(cash.next_voucher_reset, date.today()+timedelta(days=1))
+
+
+class PropagateVoucherValueTest(TestCase):
+    """Tests propagating a voucher's new value to its customers"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        test_voucher = Voucher.objects.create(
+            voucher_application="daily",
+            voucher_name="free breakfast",
+            voucher_value=Money(5, customsettings.CURRENCY),
+        )
+        for card, remaining in ((99, 5), (98, 1)):
+            test_customer = Customer.objects.create(
+                card_number=card,
+                first_name='John',
+                surname='Smith',
+            )
+            Cash.objects.create(
+                customer_id=test_customer.pk,
+                cash_value=Money(2, customsettings.CURRENCY),
+                voucher_value=Money(remaining, customsettings.CURRENCY),
+            )
+            VoucherLink.objects.create(
+                customer_id=test_customer.pk,
+                voucher_id=test_voucher.pk,
+                last_applied=date.today(),
+                voucher_value=Money(remaining, customsettings.CURRENCY),
+            )
+
+    def test_value_increase(self):
+        """Raising a voucher's value adds the difference to every customer"""
+        test_voucher = Voucher.objects.get(voucher_name="free breakfast")
+        old_value = test_voucher.voucher_value
+        test_voucher.voucher_value = Money(7, customsettings.CURRENCY)
+        test_voucher.save()
+        link_count, cash_count = propagate_voucher_value(test_voucher, old_value)
+        self.assertEqual((link_count, cash_count), (2, 2))
+        self.assertEqual(
+            Cash.objects.get(customer__card_number=99).voucher_value,
+            Money(7, customsettings.CURRENCY)
+        )
+        self.assertEqual(
+            Cash.objects.get(customer__card_number=98).voucher_value,
+            Money(3, customsettings.CURRENCY)
+        )
+
+    def test_value_decrease_stops_at_zero(self):
+        """Lowering a voucher's value never leaves a negative voucher balance"""
+        test_voucher = Voucher.objects.get(voucher_name="free breakfast")
+        old_value = test_voucher.voucher_value
+        test_voucher.voucher_value = Money(2, customsettings.CURRENCY)
+        test_voucher.save()
+        propagate_voucher_value(test_voucher, old_value)
+        self.assertEqual(
+            VoucherLink.objects.get(customer__card_number=98).voucher_value,
+            Money(0, customsettings.CURRENCY)
+        )
+        self.assertEqual(
+            Cash.objects.get(customer__card_number=98).voucher_value,
+            Money(0, customsettings.CURRENCY)
+        )
+        self.assertEqual(
+            Transaction.objects.get(customer__card_number=99).voucher_value,
+            Money(-3, customsettings.CURRENCY)
+        )
+
+
+class PlanVoucherDebitTest(TestCase):
+    """Tests the voucher debit allocation plan"""
+    def setUp(self):
+        """Set up non-modified objects used by all test methods"""
+        test_customer = Customer.objects.create(
+            card_number=99,
+            first_name='John',
+            surname='Smith',
+        )
+        for application in ("monthly", "daily"):
+            test_voucher = Voucher.objects.create(
+                voucher_application=application,
+                voucher_name=application + " voucher",
+                voucher_value=Money(5, customsettings.CURRENCY),
+            )
+            VoucherLink.objects.create(
+                customer_id=test_customer.pk,
+                voucher_id=test_voucher.pk,
+                last_applied=date.today(),
+                voucher_value=Money(5, customsettings.CURRENCY),
+            )
+
+    def test_soonest_reset_debited_first(self):
+        """The voucher that resets soonest is used up first"""
+        voucher_list = list(VoucherLink.objects.select_related('voucher').order_by('pk'))
+        with self.assertNumQueries(0):
+            plan = plan_voucher_debit(voucher_list, Money(6, customsettings.CURRENCY))
+        self.assertEqual(
+            [(v.voucher.voucher_application, new_value) for v, new_value in plan],
+            [
+                ("daily", Money(0, customsettings.CURRENCY)),
+                ("monthly", Money(4, customsettings.CURRENCY)),
+            ]
+        )
+
+    def test_distribute_queries(self):
+        """Distributing a debit takes one query to load and one to write"""
+        test_cash = Cash(customer_id=Customer.objects.get().pk)
+        with self.assertNumQueries(2):
+            distribute_voucher_debit(test_cash, Money(6, customsettings.CURRENCY))
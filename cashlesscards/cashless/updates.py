@@ -1,17 +1,43 @@
+"""
+Checks whether a newer version of the system has been released
+
+The check goes out to github, so pages never make it themselves. They read
+the last result from the cache, which is kept until it's replaced. Once it's
+older than VERSION_CHECK_TTL it's still shown while a background thread
+refreshes it (as does the check_updates management command).
+"""
+import threading
+from datetime import timedelta
 import urllib.request
+from django.core.cache import cache
+from django.db import connection
+from django.utils.timezone import now
+
 from . import customsettings
 
 
-def check_current_version():
+# seconds to wait for github before giving up on a check
+VERSION_CHECK_TIMEOUT = 5
+
+# seconds after a check before the next page view refreshes it
+VERSION_CHECK_TTL = 6 * 60 * 60
+
+VERSION_CACHE_KEY = 'cashless:version_check'
+
+_refresh_lock = threading.Lock()
+
+
+def check_current_version(timeout=VERSION_CHECK_TIMEOUT):
     """
     Compares local version to github to check
     whether the latest version is in use
     """
     url = "https://raw.githubusercontent.com/zakwarren/" \
         + "cashlesscards/master/cashlesscards/cashless/customsettings.py"
-    content = urllib.request.urlopen(url)
+    content = urllib.request.urlopen(url, timeout=timeout)
 
     # find version in github file
+    git_version = None
     for line in content:
         line = line.decode('utf-8')
         if line[:7] == "VERSION":
@@ -21,6 +47,8 @@ def check_current_version():
             except:
                 git_version = line[10:]
                 current_version = str(customsettings.VERSION)
+    if git_version is None:
+        raise ValueError("No version found in " + url)
 
     # check git version against currently installed local version
     if git_version == current_version:
@@ -28,3 +56,54 @@ def check_current_version():
     else:
         version_match = False
     return version_match, git_version
+
+
+def refresh_version_check():
+    """Checks github for the latest version and caches the result,
+    which is None if github couldn't be reached"""
+    try:
+        result = check_current_version()
+    except Exception:
+        result = None
+    cache.set(
+        VERSION_CACHE_KEY,
+        {'result': result, 'checked': now()},
+        # kept past its TTL, so pages have something to show while it's refreshed
+        None,
+    )
+    return result
+
+
+def cached_version_check():
+    """Returns the cached check as a (result, checked time) pair without
+    waiting for the network, starting a background refresh if it's missing
+    or out of date. The result is None if github couldn't be reached, and
+    both are None if no check has been made yet."""
+    cached = cache.get(VERSION_CACHE_KEY)
+    if cached is None:
+        start_background_refresh()
+        return None, None
+    if now() - cached['checked'] > timedelta(seconds=VERSION_CHECK_TTL):
+        start_background_refresh()
+    return cached['result'], cached['checked']
+
+
+def start_background_refresh():
+    """Refreshes the check in a background thread, unless one is already running"""
+    if not _refresh_lock.acquire(blocking=False):
+        return
+    thread = threading.Thread(target=_background_refresh, daemon=True)
+    try:
+        thread.start()
+    except RuntimeError:
+        _refresh_lock.release()
+
+
+def _background_refresh():
+    """Runs a refresh and lets the next one start"""
+    try:
+        refresh_version_check()
+    finally:
+        # the cache backend may have opened a connection in this thread
+        connection.close()
+        _refresh_lock.release()
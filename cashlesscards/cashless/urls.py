@@ -34,4 +34,5 @@ urlpatterns = [
     # logs and reports
     path('log', views.ActivityLog.as_view(), name='activity_log'),
     path('log/activitylog.csv', views.ActivityLogToCsv.as_view(), name='activity_log_csv'),
+    path('log/summary', views.summary_report, name='summary_report'),
 ]
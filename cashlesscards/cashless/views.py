@@ -1,25 +1,39 @@
+import csv
 import datetime
 import stripe
 
 from django.shortcuts import render, get_object_or_404
+from django.db import transaction, IntegrityError
 from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncYear
 from django.views import generic
 from django.conf import settings
 
+from django.contrib import messages
 from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.views.generic.edit import UpdateView, DeleteView
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.urls import reverse, reverse_lazy
+from django.utils.timezone import localdate, localtime, make_aware
 from djmoney.money import Money
 
 from . import customsettings
-from .models import Customer, Cash, Transaction, VoucherLink, Voucher
+from .models import Customer, Cash, Transaction, VoucherLink, Voucher, DailyRollup
 from .forms import AddCashForm, DeductCashForm, AddCashForStripePaymentForm
 from .forms import AddVoucherLinkForm, RemoveVoucherLinkForm
-from .forms import CreateNewVoucherForm, CreateNewCustomerForm
-from .voucherhandler import apply_voucher, debit_voucher
-from .updates import check_current_version
+from .forms import CreateNewVoucherForm, CreateNewCustomerForm, UpdateVoucherForm
+from .forms import ActivityLogFilterForm
+from .voucherhandler import apply_voucher, clear_next_voucher_reset
+from .voucherhandler import propagate_voucher_value
+from .posting import post_credit, post_debit, InsufficientFunds
+from .pagination import KeysetPaginationMixin
+from .rollups import record_transactions
+from .counters import read_counters, CUSTOMERS, ACCOUNTS, CASH, VOUCHER
+from .cards import find_customer
+from .updates import cached_version_check
+from .replica import reads_from_replica, ReplicaReadMixin
+from .db import lock_rows
 
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -27,30 +41,45 @@ stripe.api_key = settings.STRIPE_SECRET_KEY
 DEFAULT_VALUE = 5
 DEFAULT_PAGINATION = 10
 
+# number of log rows fetched from the database at a time for CSV downloads
+CSV_CHUNK_SIZE = 2000
+
+# periods the summary report can total the daily rollups over
+SUMMARY_PERIODS = {
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
 
 def index(request):
     """Homepage for the cashless card system"""
     return render(request, 'index.html')
 
 
+@reads_from_replica
 def info(request):
     """Displays general information about the site."""
 
-    # Generate counts of some of the main objects
-    num_customers = Customer.objects.all().count()
-    num_cash = Cash.objects.all().count()
-
-    # Total cash held in system set to correct format
-    sum_cash = Cash.objects.aggregate(Sum('cash_value'))['cash_value__sum']
-    sum_cash = str("{:.2f}".format(sum_cash))
-
-    # check current version if possible
-    try:
-        version_match, git_version = check_current_version()
-        update_message = "Version " + str(git_version) + " is available."
-    except:
+    # read the running totals rather than counting the tables
+    counters = read_counters()
+    num_customers = int(counters[CUSTOMERS])
+    num_cash = int(counters[ACCOUNTS])
+
+    # Totals held in system set to correct format
+    sum_cash = str("{:.2f}".format(counters[CASH]))
+    sum_voucher = str("{:.2f}".format(counters[VOUCHER]))
+
+    # read the last update check, which is refreshed in the background
+    result, checked = cached_version_check()
+    if checked is None:
+        version_match = True
+        update_message = ""
+    elif result is None:
         version_match = False
         update_message = "Unable to check for updates."
+    else:
+        version_match, git_version = result
+        update_message = "Version " + str(git_version) + " is available."
 
     context = {
         'version': customsettings.VERSION,
@@ -59,6 +88,7 @@ def info(request):
         'num_customers': num_customers,
         'num_cash': num_cash,
         'sum_cash': sum_cash,
+        'sum_voucher': sum_voucher,
     }
 
     # Render the HTML template info.html with the data in the context variable
@@ -75,9 +105,9 @@ def search(request):
         results = None
     try:
         if query:
-            results = Customer.objects.get(card_number=query)
+            results = find_customer(query)
             apply_voucher(results)
-            cash_inst = Cash.objects.get(customer_id=results.pk)
+            cash_inst = results.cash
             results.total_balance = cash_inst.cash_value + cash_inst.voucher_value
             results.use_stripe = customsettings.USE_STRIPE
     except:
@@ -127,16 +157,11 @@ def customer_payment(request, pk):
             )
 
             if charge['status'] == 'succeeded':
-                cash_inst.cash_value += clean_data
-                # log transaction data
-                credit = Transaction(
-                    customer_id=pk,
-                    transaction_type="stripe",
-                    transaction_value=clean_data,
-                    )
-                # write it to the model cash_value field
-                cash_inst.save()
-                credit.save()
+                # credit the account and log the transaction
+                post_credit(pk, clean_data, transaction_type="stripe")
+
+            # read the account again, as it may have been debited during the payment
+            cash_inst = Cash.objects.get(customer_id=pk)
 
             # render success confirmation page
             total_balance = cash_inst.cash_value + cash_inst.voucher_value
@@ -200,16 +225,8 @@ def add_cash_cashier(request, pk):
         if form.is_valid():
             # process the data in form.cleaned_data as required
             clean_data = form.cleaned_data['cash_to_add']
-            cash_inst.cash_value += clean_data
-            # log transaction data
-            credit = Transaction(
-                customer_id=pk,
-                transaction_type="credit",
-                transaction_value=clean_data,
-                )
-            # write it to the model cash_value field
-            cash_inst.save()
-            credit.save()
+            # credit the account and log the transaction
+            post_credit(pk, clean_data)
 
             # redirect to a new URL:
             return HttpResponseRedirect(
@@ -241,23 +258,12 @@ def deduct_cash_cashier(request, pk):
             # process the data in form.cleaned_data as required
             clean_data = form.cleaned_data['cash_to_deduct']
 
-            # check if amount to deduct is less than or equal to what customer has available
-            if clean_data <= (cash_inst.cash_value + cash_inst.voucher_value):
-                # conduct debit, debiting any vouchers first
-                cash_inst, voucher_debit, cash_debit = debit_voucher(cash_inst, clean_data)
-                # log transaction data
-                debit = Transaction(
-                    customer_id=pk,
-                    transaction_type="debit",
-                    transaction_value=cash_debit,
-                    voucher_value=voucher_debit,
-                    )
-                # write it to the model cash_value field
-                cash_inst.save()
-                debit.save()
+            try:
+                # conduct debit, debiting any vouchers first, and log the transaction
+                post_debit(pk, clean_data, cash_inst)
 
             # if amount to deduct is more than customer can afford
-            else:
+            except InsufficientFunds:
                 # generate contextual message and default form
                 message = True
                 proposed_cash_value = Money(DEFAULT_VALUE, customsettings.CURRENCY)
@@ -288,13 +294,9 @@ def add_voucher_link(request, pk):
     """View function for assigning a voucher to a specific customer's account"""
     link_inst = VoucherLink.objects.filter(customer_id=pk)
     custom_inst = Customer.objects.get(pk=pk)
-    # get voucher details
-    existing_vouchers = []
-    for link in link_inst:
-        existing_vouchers.append(link.voucher_id)
 
     # initialize form
-    form = AddVoucherLinkForm(request.POST, existing_vouchers=existing_vouchers)
+    form = AddVoucherLinkForm(request.POST, customer_id=pk)
 
     if request.method == "POST":
         if form.is_valid():
@@ -306,13 +308,21 @@ def add_voucher_link(request, pk):
                 customer_id=int(pk),
                 voucher_id=int(clean_data),
             )
-            # write it to the model
-            new_voucher.save()
+            try:
+                # write it to the model
+                with transaction.atomic():
+                    new_voucher.save()
+            except IntegrityError:
+                # the voucher was assigned by someone else since the form was checked
+                form.add_error('voucher', form.link_exists_message)
+            else:
+                # new vouchers are applied on the customer's next lookup
+                clear_next_voucher_reset(customer_id=pk)
 
-            # redirect to a new URL
-            return HttpResponseRedirect(
-                reverse('customer_detail', kwargs={'pk':pk})
-                )
+                # redirect to a new URL
+                return HttpResponseRedirect(
+                    reverse('customer_detail', kwargs={'pk':pk})
+                    )
 
     # if this is a GET (or any other method) create the default form.
     else:
@@ -321,7 +331,7 @@ def add_voucher_link(request, pk):
             initial={
                 'voucher': proposed_voucher,
             },
-            existing_vouchers=existing_vouchers
+            customer_id=pk
         )
 
     return render(request, 'cashless/voucher_assign.html', {
@@ -346,6 +356,7 @@ def remove_voucher_link(request, pk, voucher_id):
             if delete_voucher is True:
                 # delete the voucher
                 link_inst.delete()
+                clear_next_voucher_reset(customer_id=pk)
 
                 # redirect to a new URL
                 return HttpResponseRedirect(
@@ -368,14 +379,8 @@ def remove_voucher_link(request, pk, voucher_id):
 @permission_required('cashless.can_add_vouchers')
 def create_new_voucher(request):
     """View function for creating a new voucher"""
-    vouch_inst = Voucher.objects.all()
-    # get voucher details
-    existing_vouchers = []
-    for vouch in vouch_inst:
-        existing_vouchers.append(vouch.voucher_name)
-
     # initialize form
-    form = CreateNewVoucherForm(request.POST, existing_vouchers=existing_vouchers)
+    form = CreateNewVoucherForm(request.POST)
 
     if request.method == "POST":
         if form.is_valid():
@@ -390,13 +395,18 @@ def create_new_voucher(request):
                 voucher_name=clean_name,
                 voucher_value=clean_value,
             )
-            # write it to the model
-            new_voucher.save()
-
-            # redirect to a new URL
-            return HttpResponseRedirect(
-                reverse('voucher_detail', kwargs={'pk':new_voucher.pk})
-            )
+            try:
+                # write it to the model
+                with transaction.atomic():
+                    new_voucher.save()
+            except IntegrityError:
+                # the name was taken by someone else since the form was checked
+                form.add_error('name', form.voucher_exists_message)
+            else:
+                # redirect to a new URL
+                return HttpResponseRedirect(
+                    reverse('voucher_detail', kwargs={'pk':new_voucher.pk})
+                )
 
     # if this is a GET (or any other method) create the default form.
     else:
@@ -408,8 +418,7 @@ def create_new_voucher(request):
                 'application': proposed_application,
                 'name': proposed_name,
                 'value': proposed_value,
-            },
-            existing_vouchers=existing_vouchers
+            }
         )
 
     return render(request, 'cashless/voucher_new.html', {
@@ -417,7 +426,7 @@ def create_new_voucher(request):
     })
 
 
-class VoucherListView(PermissionRequiredMixin, generic.ListView):
+class VoucherListView(PermissionRequiredMixin, ReplicaReadMixin, generic.ListView):
     """A list of all vouchers using the generic list view"""
     permission_required = 'cashless.can_add_vouchers'
     model = Voucher
@@ -434,14 +443,33 @@ class VoucherUpdate(PermissionRequiredMixin, UpdateView):
     """Voucher update form using the generic view"""
     permission_required = 'cashless.can_add_vouchers'
     model = Voucher
-    fields = [
-        'voucher_application',
-        'voucher_name',
-        'voucher_value'
-    ]
+    form_class = UpdateVoucherForm
     template_name_suffix = '_handler'
     success_url = reverse_lazy('voucher_list')
 
+    def form_valid(self, form):
+        """Recheck customers' vouchers if the application period changes
+        and apply any change in value to them if requested"""
+        # save the voucher and move its holders' balances together, holding
+        # the voucher so a second edit can't propagate from the same old value
+        with transaction.atomic():
+            old_value = lock_rows(Voucher.objects.filter(pk=self.object.pk)).values_list(
+                'voucher_value', flat=True
+            ).get()
+            response = super(VoucherUpdate, self).form_valid(form)
+            if 'voucher_application' in form.changed_data:
+                clear_next_voucher_reset(customer__voucherlink__voucher_id=self.object.pk)
+            propagate = form.cleaned_data['propagate'] and self.object.voucher_value != old_value
+            if propagate:
+                link_count, cash_count = propagate_voucher_value(self.object, old_value)
+        if propagate:
+            messages.success(
+                self.request,
+                "Updated " + str(link_count) + " assigned vouchers across "
+                + str(cash_count) + " customer accounts."
+            )
+        return response
+
 
 class VoucherDelete(PermissionRequiredMixin, DeleteView):
     """Voucher delete form using the generic view"""
@@ -453,14 +481,8 @@ class VoucherDelete(PermissionRequiredMixin, DeleteView):
 @permission_required('cashless.can_add_customers')
 def create_new_customer(request):
     """View function for creating a new voucher"""
-    # get customer details
-    cust_inst = Customer.objects.all()
-    existing_cards = []
-    for cust in cust_inst:
-        existing_cards.append(cust.card_number)
-
     # initialize form
-    form = CreateNewCustomerForm(request.POST, existing_cards=existing_cards)
+    form = CreateNewCustomerForm(request.POST)
 
     if request.method == "POST":
         if form.is_valid():
@@ -470,33 +492,39 @@ def create_new_customer(request):
             clean_card_number = form.cleaned_data['card_number']
             clean_opening_balance = form.cleaned_data['opening_balance']
 
-            # build new customer and write to model
-            new_customer = Customer(
-                card_number=clean_card_number,
-                first_name=clean_first_name,
-                surname=clean_surname,
-            )
-            new_customer.save()
-
-            # build new cash account and write to model
-            new_cash = Cash(
-                customer_id=new_customer.pk,
-                cash_value=clean_opening_balance,
-            )
-            new_cash.save()
+            try:
+                with transaction.atomic():
+                    # build new customer and write to model
+                    new_customer = Customer(
+                        card_number=clean_card_number,
+                        first_name=clean_first_name,
+                        surname=clean_surname,
+                    )
+                    new_customer.save()
 
-            # build new transaction record and write to model
-            new_transaction = Transaction(
-                customer_id=new_customer.pk,
-                transaction_type="credit",
-                transaction_value=clean_opening_balance,
-            )
-            new_transaction.save()
+                    # build new cash account and write to model
+                    new_cash = Cash(
+                        customer_id=new_customer.pk,
+                        cash_value=clean_opening_balance,
+                    )
+                    new_cash.save()
 
-            # redirect to a new URL
-            return HttpResponseRedirect(
-                reverse('customer_detail', kwargs={'pk':new_customer.pk})
-            )
+                    # build new transaction record and write to model
+                    new_transaction = Transaction(
+                        customer_id=new_customer.pk,
+                        transaction_type="credit",
+                        transaction_value=clean_opening_balance,
+                    )
+                    new_transaction.save()
+                    record_transactions([new_transaction])
+            except IntegrityError:
+                # the card was registered by someone else since the form was checked
+                form.add_error('card_number', form.card_exists_message)
+            else:
+                # redirect to a new URL
+                return HttpResponseRedirect(
+                    reverse('customer_detail', kwargs={'pk':new_customer.pk})
+                )
 
     # if this is a GET (or any other method) create the default form.
     else:
@@ -510,8 +538,7 @@ def create_new_customer(request):
                 'surname': proposed_surname,
                 'card_number': proposed_card_number,
                 'opening_balance': proposed_opening_balance,
-            },
-            existing_cards=existing_cards
+            }
         )
 
     return render(request, 'cashless/customer_new.html', {
@@ -519,11 +546,17 @@ def create_new_customer(request):
     })
 
 
-class CustomerListView(PermissionRequiredMixin, generic.ListView):
+class CustomerListView(PermissionRequiredMixin, ReplicaReadMixin, KeysetPaginationMixin,
+                       generic.ListView):
     """A list of all customers using the generic list view"""
     permission_required = 'cashless.can_add_customers'
     model = Customer
     paginate_by = DEFAULT_PAGINATION
+    keyset = ('surname', 'first_name', 'id')
+
+    def get_queryset(self):
+        """Fetch each customer's balances in the same query"""
+        return Customer.objects.select_related('cash')
 
 
 class CustomerUpdate(PermissionRequiredMixin, UpdateView):
@@ -546,21 +579,143 @@ class CustomerDelete(PermissionRequiredMixin, DeleteView):
     success_url = reverse_lazy('customer_list')
 
 
-class ActivityLog(PermissionRequiredMixin, generic.ListView):
+class ActivityLog(PermissionRequiredMixin, ReplicaReadMixin, KeysetPaginationMixin,
+                  generic.ListView):
     """Transaction log using the generic list view"""
     permission_required = 'cashless.view_finance'
     model = Transaction
     paginate_by = DEFAULT_PAGINATION
+    keyset = ('-transaction_time', '-id')
     context_object_name = 'transaction_log'
     template_name = 'cashless/activity_log.html'
 
+    def get_date_range(self):
+        """Returns the first and last days of the log to show,
+        defaulting to the current month"""
+        start = end = None
+        self.filter_form = ActivityLogFilterForm(self.request.GET)
+        if self.filter_form.is_valid():
+            start = self.filter_form.cleaned_data['start']
+            end = self.filter_form.cleaned_data['end']
+
+        if end is None:
+            end = max(start or localdate(), localdate())
+        if start is None:
+            start = end.replace(day=1)
+        return start, end
+
     def get_queryset(self):
-        """Filter log down to records from just this year"""
-        now = datetime.datetime.now()
-        return Transaction.objects.filter(transaction_time__month=now.month)
+        """Filter log down to records between the chosen dates"""
+        start, end = self.get_date_range()
+
+        # compare the raw column against local midnights, so the index can be used
+        return Transaction.objects.select_related('customer').only(
+            'transaction_time',
+            'transaction_type',
+            'transaction_value',
+            'voucher_value',
+            'customer__surname',
+            'customer__first_name',
+        ).filter(
+            transaction_time__gte=make_aware(datetime.datetime.combine(start, datetime.time.min)),
+            transaction_time__lt=make_aware(
+                datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min)
+            ),
+        )
+
+    def get_context_data(self, **kwargs):
+        """Add the filter form and its query string to the context"""
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.copy()
+        query.pop(self.cursor_kwarg, None)
+        context['filter_form'] = self.filter_form
+        context['filter_query'] = query.urlencode()
+        return context
+
+
+class Echo:
+    """File-like object that hands back whatever is written to it,
+    so the csv module can format rows for a streaming response"""
+    def write(self, value):
+        """Return the value rather than buffering it"""
+        return value
 
 
 class ActivityLogToCsv(ActivityLog):
-    """Subclass of activity log that produces a CSV file"""
-    template_name = 'cashless/activitylog.csv'
-    content_type = 'text/csv'
+    """Subclass of activity log that streams the whole chosen period as a CSV file"""
+    header = [
+        'Customer surname',
+        'Customer first name',
+        'Time',
+        'Type',
+        'Cash value',
+        'Voucher value',
+    ]
+
+    def get(self, request, *args, **kwargs):
+        """Stream the log a chunk of rows at a time rather than paginating it"""
+        queryset = self.get_queryset()
+        # choose the database now, as the rows are read after the view has returned
+        rows = queryset.using(queryset.db).values_list(
+            'customer__surname',
+            'customer__first_name',
+            'transaction_time',
+            'transaction_type',
+            'transaction_value',
+            'voucher_value',
+        ).iterator(chunk_size=CSV_CHUNK_SIZE)
+        writer = csv.writer(Echo())
+
+        def lines():
+            """Yield the formatted header and rows"""
+            yield writer.writerow(self.header)
+            for surname, first_name, time, transaction_type, cash, voucher in rows:
+                yield writer.writerow([
+                    surname,
+                    first_name,
+                    localtime(time).strftime('%Y-%m-%d %H:%M:%S'),
+                    transaction_type,
+                    cash.amount,
+                    voucher.amount,
+                ])
+
+        response = StreamingHttpResponse(lines(), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="activitylog.csv"'
+        return response
+
+
+@permission_required('cashless.view_finance')
+@reads_from_replica
+def summary_report(request):
+    """View function for the monthly or yearly transaction totals"""
+    period = request.GET.get('period', 'month')
+    if period not in SUMMARY_PERIODS:
+        period = 'month'
+
+    # read the pre-aggregated daily totals rather than the log itself,
+    # summing each day's shards into the period
+    totals = DailyRollup.objects.annotate(
+        period=SUMMARY_PERIODS[period]('day'),
+    ).values('period', 'transaction_type').annotate(
+        cash=Sum('transaction_value'),
+        voucher=Sum('voucher_value'),
+        count=Sum('transaction_count'),
+    ).order_by('-period', 'transaction_type')
+
+    summary = [
+        {
+            'period': row['period'],
+            'transaction_type': row['transaction_type'],
+            'transaction_value': row['cash'],
+            'voucher_value': row['voucher'],
+            'transaction_count': row['count'],
+        }
+        for row in totals
+    ]
+
+    context = {
+        'period': period,
+        'summary': summary,
+    }
+
+    return render(request, 'cashless/summary_report.html', context=context)
@@ -1,71 +1,126 @@
 import datetime
-import time
+from django.db import transaction
+from django.db.models import F, Q
 from djmoney.money import Money
 
 from . import customsettings
 from .models import VoucherLink, Voucher, Transaction, Cash
+from .periods import current_period_start, next_period_start, is_due
+from .rollups import record_transactions
+from .counters import add_to_counters
+from .cache import cache_aside, invalidate, VOUCHERS
+from .money import to_pence, from_pence
+from .db import lock_rows
+
+
+# number of customers reset per database transaction by the bulk reset
+RESET_BATCH_SIZE = 500
+
+# next reset date stored for customers without any vouchers
+NO_VOUCHER_RESET = datetime.date.max
 
 
 def apply_voucher(customer):
     """Resets the voucher value if haven't already this time period"""
-    # get associated records
-    voucher_list = VoucherLink.objects.filter(customer_id=customer.pk)
-    cash_inst = Cash.objects.get(customer_id=customer.pk)
+    # use the cash account loaded alongside the customer where available
+    cash_inst = customer.cash
     today = datetime.date.today()
-    value = 0
-    check = False
 
-    # if customer has any vouchers assigned
-    if voucher_list:
+    # nothing to do until the customer's next voucher is due
+    if cash_inst.next_voucher_reset is not None and today < cash_inst.next_voucher_reset:
+        return
+
+    with transaction.atomic():
+        # lock the account and read it afresh, so a credit or debit
+        # made since it was loaded isn't overwritten
+        cash_inst = lock_rows(Cash.objects.filter(pk=cash_inst.pk)).get()
+        customer.cash = cash_inst
+
+        voucher_list = list(VoucherLink.objects.filter(customer_id=customer.pk))
+        # voucher details rarely change, so they're read from the cache
+        vouchers = voucher_definitions(v.voucher_id for v in voucher_list)
+        value = 0
+        due_list = []
+        next_voucher_reset = NO_VOUCHER_RESET
+
         # loop through customer's vouchers
         for v in voucher_list:
-            v_inst = Voucher.objects.get(pk=v.voucher_id)
-
-            # utility values
-            lw = time.strptime(str(v.last_applied), "%Y-%m-%d")
-            tw = time.strptime(str(today), "%Y-%m-%d")
-            last_week = time.strftime("%W", lw)
-            today_week = time.strftime("%W", tw)
+            application, voucher_value = vouchers[v.voucher_id]
 
             # check it's appropriate to apply voucher to customer's account
-            if (v_inst.voucher_application == "daily" and v.last_applied != today) \
-                or (v_inst.voucher_application == "weekly" and last_week != today_week) \
-                or (v_inst.voucher_application == "monthly" \
-                                        and v.last_applied.month != today.month) \
-                or (v_inst.voucher_application == "yearly" and v.last_applied.year != today.year):
-
-                # define checker value
-                check = True
+            if is_due(application, v.last_applied, today):
 
                 # update voucher value
-                v.voucher_value = v_inst.voucher_value
+                v.voucher_value = voucher_value
                 v.last_applied = today
-                v.save()
+                due_list.append(v)
 
             # add voucher value to total
             value += v.voucher_value
 
+            # track when the soonest voucher is next due
+            next_voucher_reset = min(
+                next_voucher_reset,
+                next_period_start(application, v.last_applied)
+            )
 
-    if check:
-        # update cash balance
-        transact_value = value - cash_inst.voucher_value
-        cash_inst.voucher_value = value
-        cash_inst.save()
+        cash_inst.next_voucher_reset = next_voucher_reset
+
+        if due_list:
+            # write back every reset voucher at once
+            VoucherLink.objects.bulk_update(due_list, ['voucher_value', 'last_applied'])
+
+            # update cash balance
+            transact_value = value - cash_inst.voucher_value
+            cash_inst.voucher_value = value
+            cash_inst.save(update_fields=['voucher_value', 'next_voucher_reset'])
+
+            # update transaction log
+            transact = Transaction(
+                customer_id=customer.pk,
+                transaction_type="credit",
+                voucher_value=transact_value,
+            )
+            transact.save()
+            record_transactions([transact])
+            add_to_counters(voucher=transact_value.amount)
+        else:
+            cash_inst.save(update_fields=['next_voucher_reset'])
 
-        # update transaction log
-        transact = Transaction(
-            customer_id=customer.pk,
-            transaction_type="credit",
-            voucher_value=transact_value,
-        )
-        transact.save()
+
+def voucher_definitions(voucher_ids=()):
+    """Returns the application timing and value of every voucher by id,
+    cached until a voucher is changed
+
+    A process whose cache isn't shared can hold definitions from before a
+    voucher was added, so if any of the given voucher ids is missing the
+    cached definitions are discarded and read again."""
+    def read_vouchers():
+        """Read the voucher details from the database"""
+        return {
+            pk: (application, value)
+            for pk, application, value in Voucher.objects.values_list(
+                'pk', 'voucher_application', 'voucher_value'
+            )
+        }
+    vouchers = cache_aside(VOUCHERS, 'definitions', read_vouchers)
+    if not set(voucher_ids) <= vouchers.keys():
+        invalidate(VOUCHERS)
+        vouchers = cache_aside(VOUCHERS, 'definitions', read_vouchers)
+    return vouchers
+
+
+def clear_next_voucher_reset(**filters):
+    """Marks the matching cash accounts to have their vouchers checked on next lookup"""
+    Cash.objects.filter(**filters).update(next_voucher_reset=None)
 
 
 def debit_voucher(cash, value):
     """Deducts cash from voucher if customer is eligible
     and returns remainder values"""
     # distribute debit across vouchers so resetting doesn't wipe over remaining value
-    distribute_voucher_debit(cash, value)
+    if cash.voucher_value > Money(0, customsettings.CURRENCY):
+        distribute_voucher_debit(cash, value)
 
     # if value to debit is more than voucher
     if value > cash.voucher_value:
@@ -88,27 +143,172 @@ def debit_voucher(cash, value):
     return cash, voucher_debit, cash_debit
 
 
-def distribute_voucher_debit(cash, value):
+def split_debit(voucher_value, value):
+    """Splits a debit into the parts taken from the voucher balance and the
+    cash balance, using the voucher balance first"""
+    voucher_debit = min(value, voucher_value)
+    return voucher_debit, value - voucher_debit
+
+
+def distribute_voucher_debit(cash, value, voucher_list=None):
     """Deducts the value from each linked voucher so
     regular resets maintain values"""
-    voucher_list = VoucherLink.objects.filter(customer_id=cash.customer_id)
-    # if value is more than zero
-    if value > Money(0, customsettings.CURRENCY):
-        # if customer has any vouchers assigned
-        if voucher_list:
-            # loop through customer's vouchers
-            for v in voucher_list:
-
-                # if value to debit is more than selected voucher
-                if value > v.voucher_value:
-                    # debit voucher
-                    value -= v.voucher_value
-                    v.voucher_value = Money(0, customsettings.CURRENCY)
-                    v.save()
-
-                # if value to debit is less than or equal to voucher
-                elif value <= v.voucher_value:
-                    # debit voucher
-                    v.voucher_value -= value
-                    v.save()
-                    value = Money(0, customsettings.CURRENCY)
+    if voucher_list is None:
+        voucher_list = VoucherLink.objects.select_related('voucher').filter(
+            customer_id=cash.customer_id
+        )
+
+    # work out the split in memory then write back the changed vouchers at once
+    plan = plan_voucher_debit(voucher_list, value)
+    for v, new_value in plan:
+        v.voucher_value = new_value
+    if plan:
+        VoucherLink.objects.bulk_update([v for v, _ in plan], ['voucher_value'])
+
+
+def plan_voucher_debit(voucher_list, value):
+    """Splits a debit across the customer's vouchers, taking from the soonest
+    to reset first, and returns each affected voucher with its new value"""
+    plan = []
+    zero = Money(0, customsettings.CURRENCY)
+    ordered = sorted(
+        voucher_list,
+        key=lambda v: (
+            next_period_start(v.voucher.voucher_application, v.last_applied),
+            v.pk
+        )
+    )
+    for v in ordered:
+        # stop once the debit is fully covered
+        if value <= zero:
+            break
+        if v.voucher_value <= zero:
+            continue
+
+        # if value to debit is more than selected voucher
+        if value > v.voucher_value:
+            value -= v.voucher_value
+            plan.append((v, zero))
+
+        # if value to debit is less than or equal to voucher
+        else:
+            plan.append((v, v.voucher_value - value))
+            value = zero
+
+    return plan
+
+
+def reset_due_vouchers(today=None, batch_size=RESET_BATCH_SIZE):
+    """Resets every due voucher for every customer using set based updates
+    and returns the number of customer accounts credited"""
+    if today is None:
+        today = datetime.date.today()
+
+    # a link is due if it was last applied before the start of its current period
+    due = Q(pk__in=[])
+    for code, _ in customsettings.TIMING:
+        due |= Q(
+            voucher__voucher_application=code,
+            last_applied__lt=current_period_start(code, today),
+        )
+    customer_ids = list(
+        VoucherLink.objects.filter(due)
+        .order_by('customer_id')
+        .values_list('customer_id', flat=True)
+        .distinct()
+    )
+    vouchers = voucher_definitions(
+        VoucherLink.objects.filter(due).order_by().values_list('voucher_id', flat=True).distinct()
+    )
+
+    credited = 0
+    for i in range(0, len(customer_ids), batch_size):
+        batch = customer_ids[i:i + batch_size]
+        with transaction.atomic():
+            # lock the accounts first, as debits do, so none change under the reset
+            cash_list = lock_accounts(batch)
+
+            # reset the due links, one statement per voucher
+            for voucher_id, (application, voucher_value) in vouchers.items():
+                VoucherLink.objects.filter(
+                    customer_id__in=batch,
+                    voucher_id=voucher_id,
+                    last_applied__lt=current_period_start(application, today),
+                ).update(voucher_value=voucher_value, last_applied=today)
+
+            credited += recalculate_voucher_balances(batch, cash_list)
+
+    return credited
+
+
+def lock_accounts(customer_ids):
+    """Locks and returns the customers' cash accounts, always in the same
+    order so two transactions locking overlapping sets can't deadlock"""
+    return list(
+        lock_rows(Cash.objects.filter(customer_id__in=customer_ids))
+        .order_by('customer_id')
+    )
+
+
+def recalculate_voucher_balances(customer_ids, cash_list=None):
+    """Sets each customer's voucher balance to the sum of their linked vouchers,
+    logging the difference as a credit, and returns the number of accounts updated
+
+    Must be called inside a transaction. The accounts are locked before the
+    links are read unless the caller passes them already locked."""
+    if cash_list is None:
+        cash_list = lock_accounts(customer_ids)
+
+    totals = {}
+    next_resets = {}
+    links = VoucherLink.objects.filter(customer_id__in=customer_ids).values_list(
+        'customer_id', 'voucher__voucher_application', 'last_applied', 'voucher_value'
+    )
+    for customer_id, application, last_applied, amount in links:
+        totals[customer_id] = totals.get(customer_id, 0) + to_pence(amount)
+        next_resets[customer_id] = min(
+            next_resets.get(customer_id, NO_VOUCHER_RESET),
+            next_period_start(application, last_applied)
+        )
+
+    transactions = []
+    for cash_inst in cash_list:
+        value = from_pence(totals.get(cash_inst.customer_id, 0))
+        transactions.append(Transaction(
+            customer_id=cash_inst.customer_id,
+            transaction_type="credit",
+            voucher_value=value - cash_inst.voucher_value,
+        ))
+        cash_inst.voucher_value = value
+        cash_inst.next_voucher_reset = next_resets.get(cash_inst.customer_id, NO_VOUCHER_RESET)
+
+    Cash.objects.bulk_update(
+        cash_list,
+        ['voucher_value', 'next_voucher_reset'],
+        batch_size=RESET_BATCH_SIZE
+    )
+    Transaction.objects.bulk_create(transactions, batch_size=RESET_BATCH_SIZE)
+    record_transactions(transactions)
+    add_to_counters(voucher=sum(transact.voucher_value.amount for transact in transactions))
+    return len(cash_list)
+
+
+def propagate_voucher_value(voucher, old_value):
+    """Adjusts the balance of every customer holding the voucher by the change
+    in its value and returns the number of voucher links and accounts updated"""
+    difference = voucher.voucher_value - old_value
+    links = VoucherLink.objects.filter(voucher_id=voucher.pk)
+
+    with transaction.atomic():
+        cash_list = lock_accounts(links.values('customer_id'))
+
+        # move every link by the difference without letting any go negative
+        link_count = links.update(voucher_value=F('voucher_value') + to_pence(difference))
+        links.filter(voucher_value__lt=0).update(voucher_value=0)
+
+        # bring the customers' voucher totals back in line with their links
+        cash_count = recalculate_voucher_balances(
+            [cash_inst.customer_id for cash_inst in cash_list], cash_list
+        )
+
+    return link_count, cash_count
@@ -57,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'cashless.replica.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'cashlesscards.urls'
@@ -83,14 +84,59 @@ WSGI_APPLICATION = 'cashlesscards.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.0/ref/settings/#databases
 
-DATABASES = {
+if getattr(credentials, 'DB_ENGINE', 'mysql') == 'sqlite':
+    # small single server sites can keep the database in a SQLite file, with WAL
+    # journaling so pages read while a till writes, tills wait their turn rather
+    # than failing, and reads come from memory mapped pages
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': credentials.DATABASE,
+            'CONN_MAX_AGE': getattr(credentials, 'DB_CONN_MAX_AGE', 0),
+            'PRAGMAS': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 5000,
+                'mmap_size': 256 * 1024 * 1024,
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': credentials.DATABASE,
+            'USER': credentials.DB_USER,
+            'PASSWORD': credentials.DB_PASSWORD,
+            'HOST': 'localhost',
+            'PORT': '',
+            # seconds each worker keeps its connection open between requests
+            'CONN_MAX_AGE': getattr(credentials, 'DB_CONN_MAX_AGE', 0),
+        }
+    }
+
+# reports and exports read from a MySQL replica of the database, if there is one
+if getattr(credentials, 'REPLICA_HOST', ''):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        HOST=credentials.REPLICA_HOST,
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['cashless.replica.ReplicaRouter']
+
+
+# Cache shared by all the server's worker processes
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': credentials.DATABASE,
-        'USER': credentials.DB_USER,
-        'PASSWORD': credentials.DB_PASSWORD,
-        'HOST': 'localhost',
-        'PORT': '',
+        'BACKEND': getattr(
+            credentials,
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': getattr(credentials, 'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
     }
 }
 
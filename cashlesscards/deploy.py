@@ -9,11 +9,33 @@ STRIPE_WEBSITE = "https://stripe.com"
 STRIPE_CURRENCIES = "https://stripe.com/docs/currencies#minimum-and-maximum-charge-amounts"
 
 DEFAULT_DATABASE = "cashlesscards"
+SQLITE_DATABASE = "cashlesscards.sqlite3"
 DEFAULT_ALLOWED_HOSTS = "'*'"
 DEFAULT_LANGUAGE = "en-gb"
 DEFAULT_TIMEZONE = "GB"
 DEFAULT_CURRENCY = "GBP"
 DEFAULT_MIN_CHARGE = 0.3
+FILE_CACHE = "django.core.cache.backends.filebased.FileBasedCache"
+MEMCACHED_CACHE = "django.core.cache.backends.memcached.MemcachedCache"
+DEFAULT_MEMCACHED_LOCATION = "127.0.0.1:11211"
+DEFAULT_CONN_MAX_AGE = 600
+
+
+def choose_database():
+    """Choose between MySQL and SQLite"""
+    print("MySQL suits most sites. A small site with a couple of tills on", end=" ")
+    print("a single server can keep its data in a SQLite file instead,", end=" ")
+    print("with no database server to run.")
+    engine = input("Which database do you want to use? (mysql/sqlite) ")
+    if engine == "sqlite" or engine == "SQLite" or engine == "SQLITE":
+        return "sqlite"
+    return "mysql"
+
+
+def configure_sqlite():
+    """Set up SQLite database"""
+    # the file is created by django when the models are migrated
+    return os.path.abspath(SQLITE_DATABASE), "", ""
 
 
 def configure_mysql():
@@ -46,7 +68,7 @@ def configure_mysql():
     return db, db_user, db_password
 
 
-def setup_credentials(db, db_user, db_password):
+def setup_credentials(engine, db, db_user, db_password):
     """Set up credentials file"""
     from django.core.management import utils
     key = utils.get_random_secret_key()
@@ -86,18 +108,63 @@ def setup_credentials(db, db_user, db_password):
         publishable_key = ""
         secret_key = ""
 
+    print("The system caches data shared by all of the server's processes.", end=" ")
+    print("By default this is kept in files on the server. If memcached is", end=" ")
+    print("installed (along with the python-memcached package), it can be used instead.")
+    memcached = input("Do you want to use memcached for the cache? (y/n) ")
+    if memcached == "yes" or memcached == "Yes" or memcached == "y" or memcached == "Y":
+        cache_backend = MEMCACHED_CACHE
+        cache_location = input(
+            "Enter the memcached address (default " + DEFAULT_MEMCACHED_LOCATION + "): "
+        )
+        if cache_location == "":
+            cache_location = DEFAULT_MEMCACHED_LOCATION
+    else:
+        cache_backend = FILE_CACHE
+        cache_location = os.path.abspath("cache")
+
+    print("Each server process can keep its database connection open between", end=" ")
+    print("requests rather than connecting again for every request, which", end=" ")
+    print("makes pages quicker. Connections that the database has dropped are reopened.")
+    persistent = input("Do you want to keep database connections open? (y/n) ")
+    if persistent == "yes" or persistent == "Yes" or persistent == "y" or persistent == "Y":
+        conn_max_age = input(
+            "Enter the seconds to keep each connection for (default "
+            + str(DEFAULT_CONN_MAX_AGE) + "): "
+        )
+        try:
+            conn_max_age = int(conn_max_age)
+        except ValueError:
+            conn_max_age = DEFAULT_CONN_MAX_AGE
+    else:
+        conn_max_age = 0
+
+    if engine == "mysql":
+        print("Reports can be read from a MySQL replica of the database, so", end=" ")
+        print("that they don't slow down the tills. Leave the line blank if", end=" ")
+        print("there's no replica.")
+        replica_host = input("Enter the replica's host: ")
+    else:
+        replica_host = ""
+
     contents = '"""\n' \
         + "Credentials required by in the cashless cards project\n" \
         + "Ensure this is not served and kept a secret!\n" \
         + '"""\n\n' \
         + "# CRSF token\n" \
         + "SECRET_KEY = '" + key + "'\n\n\n" \
-        + "# MySQL database details\n" \
+        + "# database details\n" \
+        + "DB_ENGINE = '" + engine + "'\n" \
         + "DATABASE = '" + db + "'\n" \
         + "DB_USER = '" + db_user + "'\n" \
-        + "DB_PASSWORD = '" + db_password + "'\n\n\n" \
+        + "DB_PASSWORD = '" + db_password + "'\n" \
+        + "DB_CONN_MAX_AGE = " + str(conn_max_age) + "\n" \
+        + "REPLICA_HOST = '" + replica_host + "'\n\n\n" \
         + "# allowed hosts\n" \
         + "ALLOWED_HOSTS = " + str(hosts) + "\n\n\n" \
+        + "# shared cache\n" \
+        + "CACHE_BACKEND = '" + cache_backend + "'\n" \
+        + "CACHE_LOCATION = '" + cache_location + "'\n\n\n" \
         + "# site security\n" \
         + "SSL_ENABLED = " + str(ssl) + "\n\n\n" \
         + "# stripe checkout keys\n" \
@@ -174,7 +241,9 @@ def setup_custom_settings(use_stripe):
         + "# minimum value accepted by stripe.js card payment\n" \
         + "# see https://stripe.com/docs/currencies#minimum-and-maximum-charge-amounts\n" \
         + "# for details of absolute stripe.js minimums\n" \
-        + "MINIMUM_CARD_PAYMENT_VALUE = " + str(0.3)
+        + "MINIMUM_CARD_PAYMENT_VALUE = " + str(0.3) + "\n\n\n" \
+        + "# keep daily transaction totals for each customer as well as overall\n" \
+        + "ROLLUP_BY_CUSTOMER = " + str(False) + "\n"
 
     fname = "cashless/customsettings.py"
     with open(fname, 'w') as f:
@@ -227,8 +296,12 @@ def launch_site():
 
 def main():
     """Entry point to program"""
-    db, db_user, db_password = configure_mysql()
-    use_stripe = setup_credentials(db, db_user, db_password)
+    engine = choose_database()
+    if engine == "sqlite":
+        db, db_user, db_password = configure_sqlite()
+    else:
+        db, db_user, db_password = configure_mysql()
+    use_stripe = setup_credentials(engine, db, db_user, db_password)
     deploy_production()
     setup_custom_settings(use_stripe)
     django_deploy()